@@ -0,0 +1,508 @@
+"""Home Assistant entry points of the Noonlight integration."""
+
+import asyncio
+import logging
+
+import homeassistant.helpers.config_validation as cv
+import homeassistant.util.dt as dt_util
+import voluptuous as vol
+from homeassistant import config_entries
+from homeassistant.components import persistent_notification
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import (
+    CONF_ID,
+    CONF_LATITUDE,
+    CONF_LONGITUDE,
+    EVENT_HOMEASSISTANT_STOP,
+    Platform,
+)
+from homeassistant.core import DOMAIN as HOMEASSISTANT_DOMAIN
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import instance_id
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.issue_registry import IssueSeverity, async_create_issue
+from homeassistant.helpers.typing import ConfigType
+
+import noonlight as nl
+
+from .const import (
+    ATTR_CONFIG_ENTRY_ID,
+    CONF_ADDRESS_LINE1,
+    CONF_ADDRESS_LINE2,
+    CONF_API_ENDPOINT,
+    CONF_CITY,
+    CONF_LEASE_PATH,
+    CONF_PIN,
+    CONF_RELAY,
+    CONF_SECRET,
+    CONF_STATE,
+    CONF_TOKEN_ENDPOINT,
+    CONF_ZIP,
+    CONST_NOONLIGHT_HA_SERVICE_CANCEL_ALARM,
+    CONST_NOONLIGHT_HA_SERVICE_CREATE_ALARM,
+    CONST_NOONLIGHT_HA_SERVICE_PROVISION_SITES,
+    CONST_NOONLIGHT_HA_SERVICE_QUERY_ALARM_HISTORY,
+    CONST_NOONLIGHT_SERVICE_TYPES,
+    DATA_SCHEDULER,
+    DOMAIN,
+    EVENT_NOONLIGHT_ALARM_CREATE_FAILED,
+    EVENT_NOONLIGHT_ENTRY_LOADED,
+    EVENT_NOONLIGHT_TOKEN_RENEWAL_FAILED,
+    EVENT_NOONLIGHT_TOKEN_RENEWAL_RECOVERED,
+    NOTIFICATION_ALARM_CREATE_FAILURE,
+    NOTIFICATION_TOKEN_UPDATE_FAILURE,
+    NOTIFICATION_TOKEN_UPDATE_SUCCESS,
+    OUTCOME_ACTIVE,
+    OUTCOME_FAILED,
+)
+from .engine import (
+    DISPATCH_PENDING,
+    NoonlightEngine,
+    NoonlightEngineError,
+)
+from .history import AlarmRecord, NoonlightAlarmHistory
+from .lease import NoonlightLease
+from .provision import PROVISION_PARALLELISM, async_provision_sites
+from .resolver import async_get_dns_session
+from .scheduler import NoonlightRequestScheduler
+from .websocket_api import async_register_websocket_commands
+
+__all__ = [
+    "CONFIG_SCHEMA",
+    "PLATFORMS",
+    "NoonlightException",
+    "NoonlightIntegration",
+    "async_setup",
+    "async_setup_entry",
+    "async_unload_entry",
+    "async_update_listener",
+]
+
+_LOGGER = logging.getLogger(__name__)
+PLATFORMS = [Platform.SWITCH]
+
+CONFIG_SCHEMA = vol.Schema(
+    {
+        DOMAIN: vol.Schema(
+            {
+                vol.Required(CONF_ID): cv.string,
+                vol.Required(CONF_SECRET): cv.string,
+                vol.Required(CONF_API_ENDPOINT): cv.string,
+                vol.Required(CONF_TOKEN_ENDPOINT): cv.string,
+                vol.Optional(CONF_ADDRESS_LINE1): cv.string,
+                vol.Optional(CONF_ADDRESS_LINE2): cv.string,
+                vol.Optional(CONF_CITY): cv.string,
+                vol.Optional(CONF_STATE): cv.string,
+                vol.Optional(CONF_ZIP): cv.string,
+                vol.Optional(CONF_LEASE_PATH): cv.string,
+                vol.Optional(CONF_PIN): cv.string,
+                vol.Optional(CONF_RELAY, default=False): cv.boolean,
+                vol.Inclusive(
+                    CONF_LATITUDE, "coordinates", "Include both latitude and longitude"
+                ): cv.latitude,
+                vol.Inclusive(
+                    CONF_LONGITUDE, "coordinates", "Include both latitude and longitude"
+                ): cv.longitude,
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+PROVISION_SITES_SCHEMA = vol.Schema(
+    {
+        vol.Required("path"): cv.string,
+        vol.Optional("parallelism", default=PROVISION_PARALLELISM): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=64)
+        ),
+    }
+)
+
+CREATE_ALARM_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional("service", default=[nl.NOONLIGHT_SERVICES_POLICE]): vol.All(
+            cv.ensure_list, [vol.In(CONST_NOONLIGHT_SERVICE_TYPES)]
+        ),
+        vol.Optional("alarm_key"): cv.string,
+        vol.Optional("timeout"): vol.All(
+            vol.Coerce(float), vol.Range(min=0.1, max=300)
+        ),
+    }
+)
+
+CANCEL_ALARM_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(CONF_PIN): cv.string,
+    }
+)
+
+QUERY_ALARM_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional("start"): cv.datetime,
+        vol.Optional("end"): cv.datetime,
+        vol.Optional("service"): vol.In(CONST_NOONLIGHT_SERVICE_TYPES),
+    }
+)
+
+
+def _get_integration(hass: HomeAssistant, call: ServiceCall):
+    """Return the NoonlightIntegration targeted by a service call."""
+    integrations = hass.data.get(DOMAIN, {})
+    entry_id = call.data.get(ATTR_CONFIG_ENTRY_ID)
+    if entry_id is not None:
+        if entry_id not in integrations:
+            raise NoonlightException(f"Noonlight entry {entry_id} is not loaded")
+        return integrations[entry_id]
+    if len(integrations) != 1:
+        raise NoonlightException(
+            "config_entry_id is required when more than one Noonlight site is set up"
+        )
+    return next(iter(integrations.values()))
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up from YAML."""
+
+    async def handle_create_alarm_service(call):
+        """Create a noonlight alarm from a service and report the dispatch."""
+        noonlight_integration = _get_integration(hass, call)
+        dispatch = hass.async_create_task(
+            noonlight_integration.create_alarm(
+                alarm_types=call.data["service"],
+                alarm_key=call.data.get("alarm_key", None),
+                source="service",
+            )
+        )
+        try:
+            # Shielded so a timeout only stops waiting, the dispatch carries on
+            return await asyncio.wait_for(
+                asyncio.shield(dispatch), call.data.get("timeout")
+            )
+        except asyncio.TimeoutError:
+            return {
+                "created": False,
+                "alarm_id": None,
+                "status": DISPATCH_PENDING,
+                "dispatch_latency_ms": None,
+                "error": "TimeoutError",
+            }
+
+    hass.services.async_register(
+        DOMAIN,
+        CONST_NOONLIGHT_HA_SERVICE_CREATE_ALARM,
+        handle_create_alarm_service,
+        schema=CREATE_ALARM_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def handle_cancel_alarm_service(call):
+        """Cancel the active noonlight alarm from a service"""
+        noonlight_integration = _get_integration(hass, call)
+        await noonlight_integration.cancel_alarm(pin=call.data.get(CONF_PIN))
+
+    hass.services.async_register(
+        DOMAIN,
+        CONST_NOONLIGHT_HA_SERVICE_CANCEL_ALARM,
+        handle_cancel_alarm_service,
+        schema=CANCEL_ALARM_SCHEMA,
+    )
+
+    async def handle_provision_sites_service(call):
+        """Validate and set up every site listed in a JSON or CSV file."""
+        path = hass.config.path(call.data["path"])
+        if not hass.config.is_allowed_path(path):
+            raise NoonlightException(f"Access to {path} is not allowed")
+        try:
+            report = await async_provision_sites(
+                hass, path, parallelism=call.data["parallelism"]
+            )
+        except (OSError, ValueError) as err:
+            raise NoonlightException(f"Unable to read sites from {path}: {err}")
+        return {"sites": report}
+
+    hass.services.async_register(
+        DOMAIN,
+        CONST_NOONLIGHT_HA_SERVICE_PROVISION_SITES,
+        handle_provision_sites_service,
+        schema=PROVISION_SITES_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def handle_query_alarm_history_service(call):
+        """Return alarm statistics for a time range and service type."""
+        noonlight_integration = _get_integration(hass, call)
+        start = call.data.get("start")
+        end = call.data.get("end")
+        return await noonlight_integration.history.async_query(
+            start=dt_util.as_utc(start) if start is not None else None,
+            end=dt_util.as_utc(end) if end is not None else None,
+            service=call.data.get("service"),
+        )
+
+    hass.services.async_register(
+        DOMAIN,
+        CONST_NOONLIGHT_HA_SERVICE_QUERY_ALARM_HISTORY,
+        handle_query_alarm_history_service,
+        schema=QUERY_ALARM_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async_register_websocket_commands(hass)
+
+    if DOMAIN not in config:
+        return True
+
+    _LOGGER.debug(f"[async_setup] config: {config[DOMAIN]}")
+    async_create_issue(
+        hass,
+        HOMEASSISTANT_DOMAIN,
+        f"deprecated_yaml_{DOMAIN}",
+        breaks_in_ha_version="2025.1",
+        is_fixable=False,
+        is_persistent=False,
+        issue_domain=DOMAIN,
+        severity=IssueSeverity.WARNING,
+        translation_key="deprecated_yaml",
+        translation_placeholders={
+            "domain": DOMAIN,
+            "integration_title": "Noonlight",
+        },
+    )
+
+    hass.async_create_task(
+        hass.config_entries.flow.async_init(
+            DOMAIN,
+            context={"source": config_entries.SOURCE_IMPORT},
+            data=config[DOMAIN],
+        )
+    )
+    return True
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Set up from a config entry."""
+
+    _LOGGER.debug(f"[init async_setup_entry] entry: {entry.data}")
+    if entry.unique_id is None:
+        _async_backfill_unique_id(hass, entry)
+    session = await async_get_dns_session(
+        hass, (entry.data[CONF_API_ENDPOINT], entry.data[CONF_TOKEN_ENDPOINT])
+    )
+    noonlight_integration = NoonlightIntegration(
+        hass, entry.data, entry.entry_id, session=session
+    )
+    hass.data.setdefault(DOMAIN, {})
+    hass.data[DOMAIN][entry.entry_id] = noonlight_integration
+
+    noonlight_integration.history = NoonlightAlarmHistory(hass, entry.entry_id)
+    await noonlight_integration.history.async_load()
+
+    async def flush_history(event):
+        """Write queued alarm history before Home Assistant stops."""
+        await noonlight_integration.history.async_flush()
+
+    entry.async_on_unload(
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, flush_history)
+    )
+
+    if entry.data.get(CONF_LEASE_PATH):
+        lease = NoonlightLease(
+            hass, entry.data[CONF_LEASE_PATH], await instance_id.async_get(hass)
+        )
+        noonlight_integration.lease = lease
+
+        def leadership_changed(is_leader):
+            """Renew the token right away when taking over as leader."""
+            if is_leader:
+                hass.async_create_task(noonlight_integration.check_api_token())
+
+        lease.async_add_listener(leadership_changed)
+        await lease.async_start()
+
+    await noonlight_integration.async_start()
+    async_dispatcher_send(hass, EVENT_NOONLIGHT_ENTRY_LOADED, entry.entry_id)
+    entry.async_on_unload(entry.add_update_listener(async_update_listener))
+
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    return True
+
+
+@callback
+def _async_backfill_unique_id(hass: HomeAssistant, entry: ConfigEntry):
+    """Key an entry created before entries had a unique id by its Noonlight id."""
+    site_id = entry.data[CONF_ID]
+    if any(
+        other.unique_id == site_id
+        for other in hass.config_entries.async_entries(DOMAIN)
+        if other.entry_id != entry.entry_id
+    ):
+        _LOGGER.warning(
+            "Noonlight ID %s is set up more than once, remove the duplicate entry",
+            site_id,
+        )
+        return
+    hass.config_entries.async_update_entry(entry, unique_id=site_id)
+
+
+async def async_update_listener(hass: HomeAssistant, entry: ConfigEntry):
+    """Apply changed entry data to the running integration.
+
+    Only a different site id (used in entity unique ids) or lease path needs
+    a reload, everything else is applied in place so an active alarm stays
+    tracked and a valid token is kept.
+    """
+    noonlight_integration = hass.data[DOMAIN][entry.entry_id]
+    if any(
+        entry.data.get(key) != noonlight_integration.config.get(key)
+        for key in (CONF_ID, CONF_LEASE_PATH)
+    ):
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+    await async_get_dns_session(
+        hass, (entry.data[CONF_API_ENDPOINT], entry.data[CONF_TOKEN_ENDPOINT])
+    )
+    await noonlight_integration.async_update_config(entry.data)
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Unload a config entry."""
+    _LOGGER.info(f"Unloading: {entry.data}")
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unload_ok:
+        noonlight_integration = hass.data[DOMAIN][entry.entry_id]
+        if noonlight_integration.lease is not None:
+            await noonlight_integration.lease.async_stop()
+        await noonlight_integration.history.async_flush()
+        await noonlight_integration.async_stop()
+        hass.data[DOMAIN].pop(entry.entry_id)
+
+    return unload_ok
+
+
+class NoonlightException(HomeAssistantError):
+    """General exception for Noonlight Integration."""
+
+    pass
+
+
+class NoonlightIntegration(NoonlightEngine):
+    """Home Assistant adapter around the Noonlight engine.
+
+    Engine events are sent through the dispatcher, scoped to the config entry,
+    and failures are surfaced as persistent notifications. Alarms are recorded
+    in the alarm history when one is attached.
+    """
+
+    def __init__(self, hass, conf, entry_id=None, session=None):
+        """Initialize NoonlightIntegration."""
+        self.hass = hass
+        self.entry_id = entry_id
+        self.history = None
+        self._alarm_record = None
+        self._alarm_record_slot = None
+        session = session or async_get_clientsession(hass)
+        # Every site shares one scheduler, so the limits are per endpoint
+        scheduler = hass.data.get(DATA_SCHEDULER)
+        if scheduler is None:
+            scheduler = hass.data[DATA_SCHEDULER] = NoonlightRequestScheduler(session)
+        super().__init__(
+            {
+                CONF_LATITUDE: hass.config.latitude,
+                CONF_LONGITUDE: hass.config.longitude,
+                **conf,
+            },
+            session,
+            sink=self._dispatch,
+            scheduler=scheduler,
+        )
+
+    async def async_update_config(self, config):
+        """Apply changed settings, defaulting to the Home Assistant location."""
+        await super().async_update_config(
+            {
+                CONF_LATITUDE: self.hass.config.latitude,
+                CONF_LONGITUDE: self.hass.config.longitude,
+                **config,
+            }
+        )
+
+    def signal(self, event):
+        """Return the dispatcher signal of an event for this config entry."""
+        return f"{event}_{self.entry_id}"
+
+    @callback
+    def _dispatch(self, event, *args):
+        """Send an engine event to Home Assistant."""
+        if event == EVENT_NOONLIGHT_ALARM_CREATE_FAILED:
+            client_error = args[0]
+            persistent_notification.create(
+                self.hass,
+                "Failed to send an alarm to Noonlight!\n\n"
+                "({}: {})".format(type(client_error).__name__, str(client_error)),
+                "Noonlight Alarm Failure",
+                NOTIFICATION_ALARM_CREATE_FAILURE,
+            )
+        elif event == EVENT_NOONLIGHT_TOKEN_RENEWAL_FAILED:
+            fail_count = args[0]
+            persistent_notification.create(
+                self.hass,
+                "Noonlight API token failed to renew {} time{}!\n"
+                "Home Assistant will automatically attempt to renew the "
+                "API token in 3 minutes.".format(
+                    fail_count, "s" if fail_count > 1 else ""
+                ),
+                "Noonlight Token Renewal Failure",
+                NOTIFICATION_TOKEN_UPDATE_FAILURE,
+            )
+        elif event == EVENT_NOONLIGHT_TOKEN_RENEWAL_RECOVERED:
+            persistent_notification.create(
+                self.hass,
+                "Noonlight API token has now been " "renewed successfully.",
+                "Noonlight Token Renewal Success",
+                NOTIFICATION_TOKEN_UPDATE_SUCCESS,
+            )
+        async_dispatcher_send(self.hass, self.signal(event), *args)
+
+    async def cancel_alarm(self, pin=None):
+        """Cancel the active alarm using the given or configured PIN."""
+        try:
+            await super().cancel_alarm(pin)
+        except NoonlightEngineError as err:
+            raise NoonlightException(str(err)) from err
+
+    def _record_alarm_created(self, services, source, create_latency):
+        """Add the alarm that was just created, or failed, to the history."""
+        if self.history is None:
+            return
+        self._alarm_record = AlarmRecord(
+            alarm_id=self._alarm.id if self._alarm is not None else None,
+            services=services,
+            source=source,
+            outcome=OUTCOME_ACTIVE if self._alarm is not None else OUTCOME_FAILED,
+            created=self.clock.time(),
+            create_latency=create_latency,
+        )
+        self._alarm_record_slot = self.history.async_append(self._alarm_record)
+        if self._alarm is None:
+            self._alarm_record = None
+
+    def _record_alarm_ended(self, outcome):
+        """Update the history record of the current alarm with its outcome."""
+        if self.history is None or self._alarm_record is None:
+            return
+        self._alarm_record.outcome = outcome
+        self._alarm_record.time_to_cancel = (
+            self.clock.time() - self._alarm_record.created
+        )
+        self.history.async_update(self._alarm_record_slot, self._alarm_record)
+        self._alarm_record = None
@@ -14,7 +14,10 @@ from .const import (
     CONF_ADDRESS_LINE2,
     CONF_API_ENDPOINT,
     CONF_CITY,
+    CONF_LEASE_PATH,
     CONF_LOCATION_MODE,
+    CONF_PIN,
+    CONF_RELAY,
     CONF_SECRET,
     CONF_STATE,
     CONF_TOKEN_ENDPOINT,
@@ -129,6 +132,20 @@ async def _async_build_noonlight_schema(
                     mode=selector.SelectSelectorMode.LIST,
                 )
             ),
+            vol.Optional(
+                CONF_LEASE_PATH,
+                description={"suggested_value": _get_default(CONF_LEASE_PATH)},
+            ): selector.TextSelector(selector.TextSelectorConfig()),
+            vol.Optional(
+                CONF_PIN,
+                description={"suggested_value": _get_default(CONF_PIN)},
+            ): selector.TextSelector(
+                selector.TextSelectorConfig(type=selector.TextSelectorType.PASSWORD)
+            ),
+            vol.Optional(
+                CONF_RELAY,
+                default=_get_default(CONF_RELAY, False),
+            ): selector.BooleanSelector(),
         }
     )
     return build_schema
@@ -294,6 +311,9 @@ class NoonlightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self._errors = {}
         if user_input is not None:
             self._data.update(user_input)
+            await self.async_set_unique_id(self._data[CONF_ID])
+            self._abort_if_unique_id_configured()
+            self._async_abort_entries_match({CONF_ID: self._data[CONF_ID]})
             if yaml_import:
                 self._data.update(
                     {
@@ -393,6 +413,17 @@ class NoonlightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         _LOGGER.debug(f"[async_step_import] import_config: {import_config}")
         return await self.async_step_user(user_input=import_config, yaml_import=True)
 
+    async def async_step_provision(
+        self, site: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Create an entry for a site validated by the provision_sites service."""
+
+        await self.async_set_unique_id(site[CONF_ID])
+        self._abort_if_unique_id_configured()
+        self._async_abort_entries_match({CONF_ID: site[CONF_ID]})
+        _LOGGER.debug(f"[async_step_provision] site: {site[CONF_ID]}")
+        return self.async_create_entry(title=site[CONF_NAME], data=site)
+
     async def async_step_reconfigure(
         self, _: dict[str, Any] | None = None
     ) -> ConfigFlowResult:
@@ -412,8 +443,14 @@ class NoonlightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Handle a reconfiguration flow initialized by the user."""
 
         self._errors = {}
-        if user_input is not None:
+        if user_input is not None and self._id_in_use(user_input[CONF_ID]):
+            self._errors[CONF_ID] = "already_configured"
+        elif user_input is not None:
             self._data.update(user_input)
+            if user_input.get(CONF_LEASE_PATH, None) is None:
+                self._data.pop(CONF_LEASE_PATH, None)
+            if user_input.get(CONF_PIN, None) is None:
+                self._data.pop(CONF_PIN, None)
             _LOGGER.debug(f"[async_step_init] self._data: {self._data}")
             if self._data.get(CONF_LOCATION_MODE) == "latlong":
                 return await self.async_step_reconfig_latlong()
@@ -428,6 +465,14 @@ class NoonlightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=self._errors,
         )
 
+    def _id_in_use(self, site_id):
+        """Return True if another entry is set up for a Noonlight id."""
+        return any(
+            entry.entry_id != self._entry.entry_id
+            and site_id in (entry.unique_id, entry.data.get(CONF_ID))
+            for entry in self._async_current_entries(include_ignore=False)
+        )
+
     async def async_step_reconfig_address(
         self, user_input: dict[str, Any] | None = None
     ) -> ConfigFlowResult:
@@ -441,8 +486,9 @@ class NoonlightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             if user_input.get(CONF_ADDRESS_LINE2, None) is None:
                 self._data.pop(CONF_ADDRESS_LINE2, None)
             _LOGGER.debug(f"[async_step_reconfig_address] self._data: {self._data}")
-            self.hass.config_entries.async_update_entry(self._entry, data=self._data)
-            await self.hass.config_entries.async_reload(self._entry.entry_id)
+            self.hass.config_entries.async_update_entry(
+                self._entry, data=self._data, unique_id=self._data[CONF_ID]
+            )
             return self.async_abort(reason="reconfigure_successful")
 
         return self.async_show_form(
@@ -467,8 +513,9 @@ class NoonlightConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             self._data.pop(CONF_STATE, None)
             self._data.pop(CONF_ZIP, None)
             _LOGGER.debug(f"[async_step_reconfig_latlong] self._data: {self._data}")
-            self.hass.config_entries.async_update_entry(self._entry, data=self._data)
-            await self.hass.config_entries.async_reload(self._entry.entry_id)
+            self.hass.config_entries.async_update_entry(
+                self._entry, data=self._data, unique_id=self._data[CONF_ID]
+            )
             return self.async_abort(reason="reconfigure_successful")
 
         return self.async_show_form(
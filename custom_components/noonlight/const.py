@@ -1,4 +1,3 @@
-from homeassistant.const import Platform
 from noonlight import (
     NOONLIGHT_SERVICES_FIRE,
     NOONLIGHT_SERVICES_MEDICAL,
@@ -8,7 +7,12 @@ from noonlight import (
 VERSION = "v1.2.0"
 DOMAIN = "noonlight"
 
-PLATFORMS = [Platform.SWITCH]
+SOURCE_PROVISION = "provision"
+
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+
+DATA_DNS_SESSION = "noonlight_dns"
+DATA_SCHEDULER = "noonlight_scheduler"
 
 DEFAULT_NAME = "Noonlight"
 DEFAULT_API_ENDPOINT = "https://api.noonlight.com/platform/v1"
@@ -23,10 +27,16 @@ CONF_CITY = "city"
 CONF_STATE = "state"
 CONF_ZIP = "zip"
 CONF_LOCATION_MODE = "location_mode"
+CONF_LEASE_PATH = "lease_path"
+CONF_PIN = "pin"
+CONF_RELAY = "relay"
 
 CONST_ALARM_STATUS_ACTIVE = "ACTIVE"
 CONST_ALARM_STATUS_CANCELED = "CANCELED"
 CONST_NOONLIGHT_HA_SERVICE_CREATE_ALARM = "create_alarm"
+CONST_NOONLIGHT_HA_SERVICE_CANCEL_ALARM = "cancel_alarm"
+CONST_NOONLIGHT_HA_SERVICE_PROVISION_SITES = "provision_sites"
+CONST_NOONLIGHT_HA_SERVICE_QUERY_ALARM_HISTORY = "query_alarm_history"
 
 CONST_NOONLIGHT_SERVICE_TYPES = (
     NOONLIGHT_SERVICES_POLICE,
@@ -37,6 +47,20 @@ CONST_NOONLIGHT_SERVICE_TYPES = (
 EVENT_NOONLIGHT_TOKEN_REFRESHED = "noonlight_token_refreshed"
 EVENT_NOONLIGHT_ALARM_CANCELED = "noonlight_alarm_canceled"
 EVENT_NOONLIGHT_ALARM_CREATED = "noonlight_alarm_created"
+EVENT_NOONLIGHT_STATE_CHANGED = "noonlight_state_changed"
+EVENT_NOONLIGHT_LIFECYCLE = "noonlight_lifecycle"
+EVENT_NOONLIGHT_ALARM_CREATE_FAILED = "noonlight_alarm_create_failed"
+EVENT_NOONLIGHT_TOKEN_RENEWAL_FAILED = "noonlight_token_renewal_failed"
+EVENT_NOONLIGHT_TOKEN_RENEWAL_RECOVERED = "noonlight_token_renewal_recovered"
+# Sent without an entry suffix, with the entry id, once an entry is running
+EVENT_NOONLIGHT_ENTRY_LOADED = "noonlight_entry_loaded"
+
+OUTCOME_ACTIVE = 0
+# Canceled with a PIN from Home Assistant
+OUTCOME_CANCELED = 1
+OUTCOME_FAILED = 2
+# Ended at Noonlight, e.g. resolved by the operator
+OUTCOME_RESOLVED = 3
 
 NOTIFICATION_TOKEN_UPDATE_FAILURE = "noonlight_token_update_failure"
 NOTIFICATION_TOKEN_UPDATE_SUCCESS = "noonlight_token_update_success"
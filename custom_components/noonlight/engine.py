@@ -0,0 +1,745 @@
+"""Home Assistant independent core of the Noonlight integration.
+
+The engine only needs asyncio, aiohttp and the noonlight client. Time comes
+from an injectable clock, HTTP from an injectable session and everything the
+engine has to report is passed to an event sink, so it can be unit tested,
+benchmarked and embedded outside of Home Assistant.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+import noonlight as nl
+
+from .const import (
+    CONF_ADDRESS_LINE1,
+    CONF_ADDRESS_LINE2,
+    CONF_API_ENDPOINT,
+    CONF_CITY,
+    CONF_PIN,
+    CONF_RELAY,
+    CONF_SECRET,
+    CONF_STATE,
+    CONF_TOKEN_ENDPOINT,
+    CONF_ZIP,
+    CONST_ALARM_STATUS_ACTIVE,
+    CONST_ALARM_STATUS_CANCELED,
+    CONST_NOONLIGHT_SERVICE_TYPES,
+    EVENT_NOONLIGHT_ALARM_CANCELED,
+    EVENT_NOONLIGHT_ALARM_CREATE_FAILED,
+    EVENT_NOONLIGHT_ALARM_CREATED,
+    EVENT_NOONLIGHT_LIFECYCLE,
+    EVENT_NOONLIGHT_STATE_CHANGED,
+    EVENT_NOONLIGHT_TOKEN_REFRESHED,
+    EVENT_NOONLIGHT_TOKEN_RENEWAL_FAILED,
+    EVENT_NOONLIGHT_TOKEN_RENEWAL_RECOVERED,
+    OUTCOME_CANCELED,
+    OUTCOME_RESOLVED,
+)
+from .probe import get_probe
+from .relay import RelaySubscriber
+from .scheduler import (
+    PRIORITY_CANCEL,
+    PRIORITY_DISPATCH,
+    PRIORITY_LOCATION,
+    PRIORITY_STATUS,
+    PRIORITY_TOKEN,
+    NoonlightRequestScheduler,
+)
+from .snapshot import (
+    LIFECYCLE_LOCATION_UPDATED,
+    NoonlightSnapshot,
+    lifecycle_event,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Same keys as homeassistant.const, repeated so the engine does not import it
+CONF_ID = "id"
+CONF_LATITUDE = "latitude"
+CONF_LONGITUDE = "longitude"
+
+LOCATION_KEYS = (
+    CONF_ADDRESS_LINE1,
+    CONF_ADDRESS_LINE2,
+    CONF_CITY,
+    CONF_STATE,
+    CONF_ZIP,
+    CONF_LATITUDE,
+    CONF_LONGITUDE,
+)
+
+TOKEN_CHECK_INTERVAL = timedelta(minutes=15)
+TOKEN_RETRY_INTERVAL = timedelta(minutes=3)
+ALARM_STATUS_INTERVAL = timedelta(seconds=15)
+DISPATCH_DEDUPLICATED = "deduplicated"
+DISPATCH_PENDING = "pending"
+
+_EPOCH = datetime.fromtimestamp(0, timezone.utc)
+
+
+def _parse_datetime(value):
+    """Return an aware datetime from an ISO 8601 string, or None."""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class SystemClock:
+    """Clock reading the system time and running timers on the event loop."""
+
+    def now(self):
+        """Return the current UTC time."""
+        return datetime.now(timezone.utc)
+
+    def time(self):
+        """Return the current UNIX timestamp."""
+        return time.time()
+
+    def monotonic(self):
+        """Return a monotonic time in seconds."""
+        return time.monotonic()
+
+    def call_later(self, delay, callback, *args):
+        """Call `callback(*args)` after `delay` seconds, returning a handle."""
+        return asyncio.get_running_loop().call_later(delay, callback, *args)
+
+
+class NoonlightEngineError(Exception):
+    """Error raised by the Noonlight engine."""
+
+
+class NoonlightEngine:
+    """Token lifecycle, alarm dispatch and status tracking for one site.
+
+    `config` holds the site settings keyed like a config entry. Requests go
+    through `scheduler`, which should be shared by every engine in the
+    process (a private one over `session` is used otherwise). Time is read
+    from `clock` and every timer is scheduled through its call_later(), so a
+    fake clock drives the token checks, token expiry and status polling.
+    `sink(event, *args)` receives every EVENT_NOONLIGHT_* event.
+    """
+
+    def __init__(self, config, session, clock=None, sink=None, scheduler=None):
+        """Initialize the engine."""
+        self.config = config
+        self.clock = clock or SystemClock()
+        self._sink = sink or (lambda event, *args: None)
+        self._access_token_response = {}
+        self._alarm = None
+        self._alarm_key = None
+        self._status_timer = None
+        self._token_expiry_timer = None
+        self._token_check_timer = None
+        self._token_fail_count = 0
+        self._tasks = set()
+        self.snapshot = NoonlightSnapshot()
+        self.lifecycle_seq = 0
+        self.lease = None
+        self.relay = None
+        self._relay_alarm_id = None
+        self._time_to_renew = timedelta(hours=2)
+        self._websession = session
+        self.scheduler = scheduler or NoonlightRequestScheduler(self._websession)
+        self.client = nl.NoonlightClient(
+            token=self.access_token, session=self.scheduler
+        )
+        self.client.set_base_url(self.config[CONF_API_ENDPOINT])
+        self._remove_probe_listeners = []
+        self._get_probes()
+        self.relay = self._build_relay()
+        self._load_location()
+
+    def _build_relay(self):
+        """Return a relay subscriber when the site is set up behind a relay."""
+        if not self.config.get(CONF_RELAY):
+            return None
+        return RelaySubscriber(
+            self._websession,
+            f"{self.config[CONF_API_ENDPOINT].rstrip('/')}/relay/ws",
+            self.relay_status_pushed,
+            self.relay_connection_changed,
+        )
+
+    def _load_location(self):
+        # Add address portions, if exist
+        self.addline1 = self.config.get(CONF_ADDRESS_LINE1, "")
+        self.addline2 = self.config.get(CONF_ADDRESS_LINE2, "")
+        self.addcity = self.config.get(CONF_CITY, "")
+        self.addstate = self.config.get(CONF_STATE, "")
+        self.addzip = self.config.get(CONF_ZIP, "")
+
+    async def async_update_config(self, config):
+        """Apply changed settings in place, keeping the token and the alarm.
+
+        The token is only renewed when the credentials or the token endpoint
+        changed, and the current token stays in use until the new one arrives.
+        An active alarm keeps being tracked and is sent the new location.
+        """
+        old, self.config = self.config, config
+        changed = {key for key in {*old, *config} if old.get(key) != config.get(key)}
+        if not changed:
+            return
+        _LOGGER.debug("Applying changed settings: %s", ", ".join(sorted(changed)))
+        self._load_location()
+        if changed & {CONF_API_ENDPOINT, CONF_TOKEN_ENDPOINT}:
+            self.client.set_base_url(config[CONF_API_ENDPOINT])
+            watching = bool(self._remove_probe_listeners)
+            self._unwatch_endpoints()
+            self._get_probes()
+            if watching:
+                self._watch_endpoints()
+        if changed & {CONF_API_ENDPOINT, CONF_RELAY} and (
+            old.get(CONF_RELAY) or config.get(CONF_RELAY)
+        ):
+            self._stop_status_polling()
+            if self.relay is not None:
+                await self.relay.stop()
+            self.relay = self._build_relay()
+            if self.relay is not None:
+                self.relay.start()
+            if self._alarm is not None:
+                self._start_status_polling()
+        if changed & {CONF_ID, CONF_SECRET, CONF_TOKEN_ENDPOINT}:
+            await self.check_api_token(force_renew=True)
+        if changed.intersection(LOCATION_KEYS) and self._alarm is not None:
+            await self._update_alarm_location()
+
+    async def _update_alarm_location(self):
+        """Send the configured location to the active alarm."""
+        alarm = self._alarm
+        try:
+            with self.scheduler.priority(PRIORITY_LOCATION):
+                if len(self.addline1) > 0:
+                    updated = await alarm.update_location_address(
+                        line1=self.addline1,
+                        line2=self.addline2,
+                        city=self.addcity,
+                        state=self.addstate,
+                        zip=self.addzip,
+                    )
+                else:
+                    updated = await alarm.update_location_coordinates(
+                        lat=self.latitude, lng=self.longitude
+                    )
+        except (
+            nl.NoonlightClient.ClientError,
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+        ) as client_error:
+            _LOGGER.warning(
+                "Failed to update the location of alarm %s: %s", alarm.id, client_error
+            )
+            return
+        if not updated:
+            _LOGGER.warning(
+                "Noonlight did not accept the location of alarm %s", alarm.id
+            )
+            return
+        _LOGGER.debug("location of alarm %s has been updated", alarm.id)
+        self.lifecycle_seq += 1
+        self._sink(
+            EVENT_NOONLIGHT_LIFECYCLE,
+            self.lifecycle_seq,
+            LIFECYCLE_LOCATION_UPDATED,
+            self.snapshot,
+        )
+
+    async def async_start(self):
+        """Start the token check chain, the probe and the relay connection."""
+        if self.relay is not None:
+            self.relay.start()
+        self._create_task(self._async_token_check())
+        self._watch_endpoints()
+
+    async def async_stop(self):
+        """Cancel the timers, tasks and connections owned by the engine."""
+        self._unwatch_endpoints()
+        self._stop_status_polling()
+        for timer in (self._token_check_timer, self._token_expiry_timer):
+            if timer is not None:
+                timer.cancel()
+        self._token_check_timer = None
+        self._token_expiry_timer = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self.relay is not None:
+            await self.relay.stop()
+
+    def _create_task(self, coro):
+        """Run a coroutine in the background, keeping a reference to it."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _call_later(self, delay, coro_factory):
+        """Run a coroutine after `delay` seconds, returning a cancelable handle."""
+        return self.clock.call_later(
+            max(delay, 0.0), lambda: self._create_task(coro_factory())
+        )
+
+    def _publish(self, **changes):
+        """Replace the state snapshot and notify the sink if it changed."""
+        snapshot = self.snapshot.replace(**changes)
+        if snapshot == self.snapshot:
+            return
+        event = lifecycle_event(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        self._sink(EVENT_NOONLIGHT_STATE_CHANGED, snapshot)
+        if event is not None:
+            self.lifecycle_seq += 1
+            self._sink(EVENT_NOONLIGHT_LIFECYCLE, self.lifecycle_seq, event, snapshot)
+
+    def _publish_alarm(self):
+        """Publish the fields of the current alarm, or clear them."""
+        alarm = self._alarm
+        if alarm is None:
+            self._publish(
+                alarm_active=False, alarm_status=None, alarm_id=None, alarm_services=()
+            )
+            return
+        self._publish(
+            alarm_active=alarm.status == CONST_ALARM_STATUS_ACTIVE,
+            alarm_status=alarm.status,
+            alarm_id=alarm.id,
+            alarm_services=alarm.services,
+        )
+
+    def _schedule_token_expiry(self):
+        """Publish availability now and again when the token expires."""
+        if self._token_expiry_timer is not None:
+            self._token_expiry_timer.cancel()
+            self._token_expiry_timer = None
+        expires_in = self.access_token_expires_in.total_seconds()
+        self._publish(token_valid=expires_in > 0)
+        if expires_in > 0:
+            self._token_expiry_timer = self.clock.call_later(
+                expires_in, self._token_expired
+            )
+
+    def _get_probes(self):
+        """Look up the shared probes of the configured endpoints."""
+        self.api_probe = get_probe(self.scheduler, self.config[CONF_API_ENDPOINT])
+        self.token_probe = get_probe(self.scheduler, self.config[CONF_TOKEN_ENDPOINT])
+
+    def _watch_endpoints(self):
+        """Publish the results of the shared endpoint probes."""
+        self._get_probes()
+        self._remove_probe_listeners = [
+            self.api_probe.add_listener(self._api_probe_result),
+            self.token_probe.add_listener(self._token_probe_result),
+        ]
+
+    def _unwatch_endpoints(self):
+        for remove_listener in self._remove_probe_listeners:
+            remove_listener()
+        self._remove_probe_listeners = []
+
+    def _api_probe_result(self, reachable, rtt_ms):
+        """Publish the API reachability measured by the shared probe."""
+        self._publish(api_reachable=reachable, api_rtt_ms=rtt_ms)
+
+    def _token_probe_result(self, reachable, rtt_ms):
+        """Publish the token endpoint reachability measured by the shared probe."""
+        self._publish(token_endpoint_reachable=reachable)
+
+    def _token_expired(self):
+        self._token_expiry_timer = None
+        _LOGGER.debug("Noonlight access token expired at %s", self.access_token_expiry)
+        self._publish(token_valid=False)
+
+    @property
+    def latitude(self):
+        """Return the latitude of the site."""
+        return self.config.get(CONF_LATITUDE)
+
+    @property
+    def longitude(self):
+        """Return the longitude of the site."""
+        return self.config.get(CONF_LONGITUDE)
+
+    @property
+    def access_token(self):
+        """Return the access token from the Noonlight Configuration."""
+        return self._access_token_response.get("token")
+
+    @property
+    def access_token_expiry(self):
+        """Return the timestamp when the access token expires."""
+        return self._access_token_response.get("expires", _EPOCH)
+
+    @property
+    def access_token_expires_in(self):
+        """Will return the timedelta when the token expires."""
+        return self.access_token_expiry - self.clock.now()
+
+    @property
+    def should_token_be_renewed(self):
+        """Will return true if the token needs to be renewed."""
+        return (
+            self.access_token is None
+            or self.access_token_expires_in <= self._time_to_renew
+        )
+
+    async def _async_token_check(self):
+        """Check the token, then schedule the next check."""
+        self._token_check_timer = None
+        next_check_interval = TOKEN_RETRY_INTERVAL
+        try:
+            if await self.check_api_token():
+                if self._token_fail_count > 0:
+                    self._sink(EVENT_NOONLIGHT_TOKEN_RENEWAL_RECOVERED)
+                self._token_fail_count = 0
+                next_check_interval = TOKEN_CHECK_INTERVAL
+            else:
+                _LOGGER.error("API token failed renewal, retrying in 3 min")
+                self._token_fail_count += 1
+                self._sink(EVENT_NOONLIGHT_TOKEN_RENEWAL_FAILED, self._token_fail_count)
+        finally:
+            # Nothing may break the chain, or the token is never renewed again
+            self._token_check_timer = self._call_later(
+                next_check_interval.total_seconds(), self._async_token_check
+            )
+
+    async def check_api_token(self, force_renew=False):
+        """Check if Noonlight API token needs renewal and renew if so."""
+        if self.lease is not None:
+            await self._adopt_shared_token()
+            if not self.lease.is_leader:
+                _LOGGER.debug("Standby node, leaving token renewal to the leader")
+                return True
+        _LOGGER.debug(
+            "Checking if token needs renewal, expires: {0:.1f}h".format(
+                self.access_token_expires_in.total_seconds() / 3600.0
+            )
+        )
+        if self.should_token_be_renewed or force_renew:
+            try:
+                _LOGGER.debug("Renewing Noonlight access token")
+                path = self.config.get(CONF_TOKEN_ENDPOINT)
+                data = {
+                    "id": self.config.get(CONF_ID),
+                    "secret": self.config.get(CONF_SECRET),
+                }
+                headers = {"Content-Type": "application/json"}
+                token_response = {}
+                # An expired token blocks dispatch, so renewing it is urgent
+                priority = (
+                    PRIORITY_DISPATCH
+                    if self.access_token_expires_in.total_seconds() <= 0
+                    else PRIORITY_TOKEN
+                )
+                async with self.scheduler.post(
+                    path, json=data, headers=headers, priority=priority
+                ) as resp:
+                    token_response = await resp.json()
+                if "token" in token_response and "expires" in token_response:
+                    self._set_token_response(token_response)
+                    _LOGGER.debug("Token set: {}".format(self.access_token))
+                    _LOGGER.debug(
+                        "Token renewed, expires at {0} ({1:.1f}h)".format(
+                            self.access_token_expiry,
+                            self.access_token_expires_in.total_seconds() / 3600.0,
+                        )
+                    )
+                    if self.lease is not None:
+                        try:
+                            await self.lease.async_publish_token(
+                                self._access_token_response
+                            )
+                        except OSError as err:
+                            _LOGGER.warning(
+                                "Unable to share Noonlight token with standby: %s", err
+                            )
+                    self._sink(EVENT_NOONLIGHT_TOKEN_REFRESHED)
+                    return True
+                raise NoonlightEngineError(
+                    "unexpected token_response: {}".format(token_response)
+                )
+            except (
+                NoonlightEngineError,
+                aiohttp.ClientError,
+                asyncio.TimeoutError,
+            ):
+                _LOGGER.exception("Failed to renew Noonlight token")
+                self.token_probe.async_probe_soon()
+                return False
+        return True
+
+    async def _adopt_shared_token(self):
+        """Use the token published by the leader if it outlives ours."""
+        try:
+            token_response = await self.lease.async_read_token()
+        except OSError as err:
+            _LOGGER.warning("Unable to read shared Noonlight token: %s", err)
+            return
+        if "token" not in token_response or "expires" not in token_response:
+            return
+        expires = _parse_datetime(token_response["expires"])
+        if expires is None or expires <= self.access_token_expiry:
+            return
+        self._set_token_response(token_response)
+        _LOGGER.debug("Adopted shared token, expires at %s", self.access_token_expiry)
+        self._sink(EVENT_NOONLIGHT_TOKEN_REFRESHED)
+
+    def _set_token_response(self, token_response):
+        expires = _parse_datetime(token_response["expires"])
+        token_response["expires"] = expires if expires is not None else _EPOCH
+        self.client.set_token(token=token_response.get("token"))
+        self._access_token_response = token_response
+        self._schedule_token_expiry()
+        if self.relay is not None and self._relay_alarm_id is not None:
+            self._create_task(self.relay.set_token(self.access_token))
+
+    def alarm_body(self, services):
+        """Return the body of a create alarm request for the site."""
+        if len(self.addline1) > 0:
+            alarm_body = {
+                "location.address": {
+                    "line1": self.addline1,
+                    "city": self.addcity,
+                    "state": self.addstate,
+                    "zip": self.addzip,
+                }
+            }
+            if len(self.addline2) > 0:
+                alarm_body["location.address"]["line2"] = self.addline2
+        else:
+            alarm_body = {
+                "location.coordinates": {
+                    "lat": self.latitude,
+                    "lng": self.longitude,
+                    "accuracy": 5,
+                }
+            }
+        if len(services) > 0:
+            alarm_body["services"] = services
+        return alarm_body
+
+    async def update_alarm_status(self):
+        """Update the status of the current alarm."""
+        if self._alarm is not None:
+            with self.scheduler.priority(PRIORITY_STATUS):
+                status = await self._alarm.get_status()
+            self._publish_alarm()
+            return status
+
+    async def create_alarm(
+        self, alarm_types=[nl.NOONLIGHT_SERVICES_POLICE], alarm_key=None, source="other"
+    ):
+        """Create a new alarm and return the outcome of the dispatch.
+
+        If an alarm is already active, or another node already dispatched this
+        one, nothing is sent and `created` is False in the returned outcome.
+        """
+        services = {}
+        for alarm_type in alarm_types or ():
+            if alarm_type in CONST_NOONLIGHT_SERVICE_TYPES:
+                services[alarm_type] = True
+        result = {
+            "created": False,
+            "alarm_id": None,
+            "status": None,
+            "dispatch_latency_ms": None,
+            "error": None,
+        }
+        if self._alarm is not None:
+            result.update(alarm_id=self._alarm.id, status=self._alarm.status)
+            return result
+        if self.lease is not None:
+            alarm_key = alarm_key or "+".join(sorted(services)) or "alarm"
+            try:
+                claimed = await self.lease.async_claim_dispatch(alarm_key)
+            except OSError as err:
+                # Redundancy must never stop an alarm, so fail open
+                _LOGGER.warning(
+                    "Unable to claim alarm %s on the lease share (%s), "
+                    "dispatching anyway",
+                    alarm_key,
+                    err,
+                )
+                claimed = True
+            if not claimed:
+                result["status"] = DISPATCH_DEDUPLICATED
+                return result
+            self._alarm_key = alarm_key
+            if not self.lease.is_leader:
+                await self._adopt_shared_token()
+        started = self.clock.monotonic()
+        try:
+            with self.scheduler.priority(PRIORITY_DISPATCH):
+                self._alarm = await self.client.create_alarm(
+                    body=self.alarm_body(services)
+                )
+        except (
+            nl.NoonlightClient.ClientError,
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+        ) as client_error:
+            result["error"] = type(client_error).__name__
+            self._sink(EVENT_NOONLIGHT_ALARM_CREATE_FAILED, client_error)
+            self.api_probe.async_probe_soon()
+        result["dispatch_latency_ms"] = round(
+            (self.clock.monotonic() - started) * 1000.0, 1
+        )
+        self._record_alarm_created(
+            list(services), source, result["dispatch_latency_ms"]
+        )
+        if self._alarm is None:
+            await self._release_dispatch()
+            return result
+        result.update(created=True, alarm_id=self._alarm.id, status=self._alarm.status)
+        if self._alarm and self._alarm.status == CONST_ALARM_STATUS_ACTIVE:
+            self._publish_alarm()
+            self._sink(EVENT_NOONLIGHT_ALARM_CREATED)
+            _LOGGER.debug(
+                "noonlight alarm has been initiated. " "id: %s status: %s",
+                self._alarm.id,
+                self._alarm.status,
+            )
+            self._start_status_polling()
+        return result
+
+    def _start_status_polling(self):
+        """Poll the status of the current alarm until it is canceled."""
+        self._stop_status_polling()
+        if self.relay is not None:
+            # The relay polls once for all of its clients and pushes changes
+            self._relay_alarm_id = self._alarm.id
+            self._create_task(
+                self.relay.subscribe(self._relay_alarm_id, self.access_token)
+            )
+            if self.relay.connected:
+                return
+        self._status_timer = self._call_later(
+            ALARM_STATUS_INTERVAL.total_seconds(), self._check_alarm_status_interval
+        )
+
+    def _stop_status_polling(self):
+        """Stop polling the status of the current alarm."""
+        if self._status_timer is not None:
+            self._status_timer.cancel()
+            self._status_timer = None
+        if self._relay_alarm_id is not None:
+            self._create_task(self.relay.unsubscribe(self._relay_alarm_id))
+            self._relay_alarm_id = None
+
+    async def relay_status_pushed(self, alarm_id, status):
+        """Refresh the current alarm when the relay reports a status change."""
+        _LOGGER.debug("relay pushed status %s for alarm %s", status, alarm_id)
+        if self._alarm is not None and self._alarm.id == alarm_id:
+            await self._check_alarm_status()
+
+    def relay_connection_changed(self, connected):
+        """Poll the current alarm directly while the relay is unreachable."""
+        if self._relay_alarm_id is None:
+            return
+        if connected:
+            if self._status_timer is not None:
+                self._status_timer.cancel()
+                self._status_timer = None
+            # Catch up on anything that changed while nothing was pushed
+            self._create_task(self._check_alarm_status())
+        elif self._status_timer is None:
+            _LOGGER.info("Noonlight relay unreachable, polling alarm status")
+            self._status_timer = self._call_later(
+                ALARM_STATUS_INTERVAL.total_seconds(),
+                self._check_alarm_status_interval,
+            )
+
+    async def _check_alarm_status_interval(self):
+        self._status_timer = self._call_later(
+            ALARM_STATUS_INTERVAL.total_seconds(), self._check_alarm_status_interval
+        )
+        await self._check_alarm_status()
+
+    async def _check_alarm_status(self):
+        _LOGGER.debug("checking alarm status...")
+        alarm = self._alarm
+        try:
+            status = await self.update_alarm_status()
+        except (
+            nl.NoonlightClient.ClientError,
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+        ) as client_error:
+            _LOGGER.warning("Failed to check the alarm status: %s", client_error)
+            return
+        if status == CONST_ALARM_STATUS_CANCELED:
+            _LOGGER.debug("alarm %s has been canceled!", alarm.id)
+            if self._alarm is alarm:
+                await self._alarm_ended(OUTCOME_RESOLVED)
+
+    async def _alarm_ended(self, outcome):
+        """Forget the current alarm once it is no longer active."""
+        self._stop_status_polling()
+        self._alarm = None
+        self._publish_alarm()
+        self._record_alarm_ended(outcome)
+        await self._release_dispatch()
+        self._sink(EVENT_NOONLIGHT_ALARM_CANCELED)
+
+    async def cancel_alarm(self, pin=None):
+        """Cancel the active alarm using the given or configured PIN."""
+        alarm = self._alarm
+        if alarm is None:
+            return
+        pin = pin or self.config.get(CONF_PIN)
+        if not pin:
+            raise NoonlightEngineError("A PIN is required to cancel a Noonlight alarm")
+        # A poll finishing during the request would race with the cancel
+        self._stop_status_polling()
+        self._publish(alarm_active=False)
+        try:
+            with self.scheduler.priority(PRIORITY_CANCEL):
+                await self.client.update_alarm(
+                    id=alarm.id,
+                    body={"status": CONST_ALARM_STATUS_CANCELED, "pin": pin},
+                )
+        except (
+            nl.NoonlightClient.ClientError,
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+        ) as client_error:
+            if self._alarm is alarm:
+                self._publish_alarm()
+                self._start_status_polling()
+            self.api_probe.async_probe_soon()
+            raise NoonlightEngineError(
+                "Failed to cancel Noonlight alarm {} ({}: {})".format(
+                    alarm.id, type(client_error).__name__, str(client_error)
+                )
+            ) from client_error
+        _LOGGER.debug("alarm %s has been canceled on request", alarm.id)
+        if self._alarm is alarm:
+            await self._alarm_ended(OUTCOME_CANCELED)
+
+    async def _release_dispatch(self):
+        """Release the dispatch claim held for the current alarm, if any."""
+        if self.lease is not None and self._alarm_key is not None:
+            try:
+                await self.lease.async_release_dispatch(self._alarm_key)
+            except OSError as err:
+                _LOGGER.warning(
+                    "Unable to release alarm %s on the lease share: %s",
+                    self._alarm_key,
+                    err,
+                )
+        self._alarm_key = None
+
+    def _record_alarm_created(self, services, source, create_latency):
+        """Hook called once per dispatch attempt, after it succeeded or failed."""
+
+    def _record_alarm_ended(self, outcome):
+        """Hook called when the current alarm is no longer active."""
@@ -0,0 +1,228 @@
+"""Bounded, append-only alarm history stored as fixed-size records."""
+
+import logging
+import math
+import os
+import struct
+from statistics import median
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import STORAGE_DIR
+
+from .const import CONST_NOONLIGHT_SERVICE_TYPES, OUTCOME_FAILED
+
+_LOGGER = logging.getLogger(__name__)
+
+HISTORY_CAPACITY = 4096
+HISTORY_FLUSH_DELAY = 10
+HISTORY_READ_CHUNK = 256
+
+OUTCOMES = ("active", "canceled", "failed", "resolved")
+
+TRIGGER_SOURCES = ("other", "switch", "service")
+
+_HEADER = struct.Struct("<4sIII")
+_MAGIC = b"NLH1"
+# alarm id, services bitmask, trigger source, outcome, created timestamp,
+# create latency (ms), time to cancel (s, NaN while not canceled)
+_RECORD = struct.Struct("<40sBBBdff")
+
+
+def _services_mask(services):
+    mask = 0
+    for bit, service in enumerate(CONST_NOONLIGHT_SERVICE_TYPES):
+        if service in services:
+            mask |= 1 << bit
+    return mask
+
+
+class AlarmRecord:
+    """A single alarm as kept in the history."""
+
+    __slots__ = (
+        "alarm_id",
+        "services",
+        "source",
+        "outcome",
+        "created",
+        "create_latency",
+        "time_to_cancel",
+    )
+
+    def __init__(
+        self,
+        alarm_id,
+        services,
+        source,
+        outcome,
+        created,
+        create_latency,
+        time_to_cancel=math.nan,
+    ):
+        """Initialize the record."""
+        self.alarm_id = alarm_id
+        self.services = services
+        self.source = source
+        self.outcome = outcome
+        self.created = created
+        self.create_latency = create_latency
+        self.time_to_cancel = time_to_cancel
+
+    def pack(self):
+        """Return the fixed-size binary form of the record."""
+        return _RECORD.pack(
+            (self.alarm_id or "").encode()[:40],
+            _services_mask(self.services),
+            TRIGGER_SOURCES.index(self.source) if self.source in TRIGGER_SOURCES else 0,
+            self.outcome,
+            self.created,
+            self.create_latency,
+            self.time_to_cancel,
+        )
+
+
+class NoonlightAlarmHistory:
+    """Ring buffer of alarm records in the Home Assistant storage directory.
+
+    Records are queued in memory and written in batches. Queries stream the
+    file in chunks and only keep the values needed for the aggregates.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id, capacity=HISTORY_CAPACITY):
+        """Initialize the history."""
+        self.hass = hass
+        self.path = hass.config.path(STORAGE_DIR, f"noonlight.history.{entry_id}")
+        self.capacity = capacity
+        self._next_slot = 0
+        self._count = 0
+        self._pending = {}
+        self._cancel_flush = None
+
+    async def async_load(self):
+        """Read the header, creating the file when missing."""
+        self._next_slot, self._count = await self.hass.async_add_executor_job(
+            self._load
+        )
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as history_file:
+                magic, capacity, next_slot, count = _HEADER.unpack(
+                    history_file.read(_HEADER.size)
+                )
+            if magic == _MAGIC and capacity == self.capacity:
+                return next_slot, count
+            _LOGGER.warning("Discarding incompatible alarm history %s", self.path)
+        except FileNotFoundError:
+            pass
+        except struct.error:
+            _LOGGER.warning("Discarding corrupt alarm history %s", self.path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "wb") as history_file:
+            history_file.write(_HEADER.pack(_MAGIC, self.capacity, 0, 0))
+        return 0, 0
+
+    @callback
+    def async_append(self, record):
+        """Queue a new record and return the slot it was written to."""
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self.async_update(slot, record)
+        return slot
+
+    @callback
+    def async_update(self, slot, record):
+        """Queue a rewrite of the record in the given slot."""
+        self._pending[slot] = record.pack()
+        if self._cancel_flush is None:
+            self._cancel_flush = async_call_later(
+                self.hass, HISTORY_FLUSH_DELAY, self._async_scheduled_flush
+            )
+
+    async def _async_scheduled_flush(self, now):
+        self._cancel_flush = None
+        await self.async_flush()
+
+    async def async_flush(self):
+        """Write queued records to disk."""
+        if self._cancel_flush is not None:
+            self._cancel_flush()
+            self._cancel_flush = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        await self.hass.async_add_executor_job(
+            self._write, pending, self._next_slot, self._count
+        )
+
+    def _write(self, pending, next_slot, count):
+        with open(self.path, "r+b") as history_file:
+            for slot, data in sorted(pending.items()):
+                history_file.seek(_HEADER.size + slot * _RECORD.size)
+                history_file.write(data)
+            history_file.seek(0)
+            history_file.write(_HEADER.pack(_MAGIC, self.capacity, next_slot, count))
+
+    async def async_query(self, start=None, end=None, service=None):
+        """Return aggregates over records matching the filters."""
+        await self.async_flush()
+        return await self.hass.async_add_executor_job(
+            self._query,
+            start.timestamp() if start is not None else -math.inf,
+            end.timestamp() if end is not None else math.inf,
+            _services_mask([service]) if service is not None else None,
+        )
+
+    def _query(self, start, end, service_mask):
+        count = 0
+        outcomes = dict.fromkeys(OUTCOMES, 0)
+        sources = dict.fromkeys(TRIGGER_SOURCES, 0)
+        latencies = []
+        cancel_times = []
+        with open(self.path, "rb") as history_file:
+            history_file.seek(_HEADER.size)
+            remaining = self._count
+            while remaining > 0:
+                chunk = history_file.read(
+                    min(remaining, HISTORY_READ_CHUNK) * _RECORD.size
+                )
+                if not chunk:
+                    break
+                remaining -= len(chunk) // _RECORD.size
+                for (
+                    _,
+                    services,
+                    source,
+                    outcome,
+                    created,
+                    create_latency,
+                    time_to_cancel,
+                ) in _RECORD.iter_unpack(chunk):
+                    if not start <= created < end:
+                        continue
+                    if service_mask is not None and not services & service_mask:
+                        continue
+                    count += 1
+                    outcomes[OUTCOMES[outcome]] += 1
+                    sources[TRIGGER_SOURCES[source]] += 1
+                    if outcome != OUTCOME_FAILED:
+                        latencies.append(create_latency)
+                    if not math.isnan(time_to_cancel):
+                        cancel_times.append(time_to_cancel)
+        dispatched = count - outcomes["failed"]
+        return {
+            "count": count,
+            "outcomes": outcomes,
+            "sources": sources,
+            "median_dispatch_latency_ms": (
+                round(median(latencies), 1) if latencies else None
+            ),
+            "median_time_to_cancel_s": (
+                round(median(cancel_times), 1) if cancel_times else None
+            ),
+            "false_alarm_ratio": (
+                round(outcomes["canceled"] / dispatched, 3) if dispatched else None
+            ),
+        }
@@ -0,0 +1,209 @@
+"""Active/standby coordination between redundant Home Assistant nodes."""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+_LOGGER = logging.getLogger(__name__)
+
+LEASE_TTL = 10
+LEASE_RENEW_INTERVAL = timedelta(seconds=3)
+# A dispatch claim is stale once its owner has stopped refreshing it
+DISPATCH_CLAIM_TTL = LEASE_TTL
+
+
+class NoonlightLease:
+    """Shared lease file used to elect a single leader among HA nodes.
+
+    The leader is the only node that renews the API token; it publishes the
+    token next to the lease so standby nodes can still dispatch alarms. Alarm
+    dispatch from any node is deduplicated through exclusive claim files,
+    which the owning node refreshes on every lease tick until the alarm ends.
+    """
+
+    def __init__(self, hass: HomeAssistant, path, node_id):
+        """Initialize the lease."""
+        self.hass = hass
+        self.path = path
+        self.node_id = node_id
+        self._is_leader = False
+        self._listeners = []
+        self._cancel_interval = None
+        self._claims = set()
+
+    @property
+    def is_leader(self):
+        """Return True if this node currently holds the lease."""
+        return self._is_leader
+
+    @property
+    def token_path(self):
+        """Return the path of the shared token file."""
+        return f"{self.path}.token"
+
+    def _claim_path(self, alarm_key):
+        digest = hashlib.sha1(alarm_key.encode()).hexdigest()[:16]
+        return f"{self.path}.{digest}.dispatch"
+
+    @callback
+    def async_add_listener(self, update_callback):
+        """Register a callback for leadership changes."""
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            self._listeners.remove(update_callback)
+
+        return remove_listener
+
+    async def async_start(self):
+        """Try to acquire the lease now and keep renewing it."""
+        await self._async_tick()
+        self._cancel_interval = async_track_time_interval(
+            self.hass, self._async_tick, LEASE_RENEW_INTERVAL
+        )
+
+    async def async_stop(self):
+        """Stop renewing and give up the lease if held."""
+        if self._cancel_interval is not None:
+            self._cancel_interval()
+            self._cancel_interval = None
+        if self._is_leader:
+            await self.hass.async_add_executor_job(self._release)
+            self._is_leader = False
+
+    async def _async_tick(self, now=None):
+        try:
+            is_leader = await self.hass.async_add_executor_job(self._try_acquire)
+        except OSError as err:
+            _LOGGER.warning("Unable to access Noonlight lease %s: %s", self.path, err)
+            is_leader = False
+        if self._claims:
+            try:
+                await self.hass.async_add_executor_job(self._refresh_claims)
+            except OSError as err:
+                _LOGGER.warning("Unable to refresh Noonlight dispatch claims: %s", err)
+        if is_leader != self._is_leader:
+            self._is_leader = is_leader
+            _LOGGER.info(
+                "Noonlight node %s is now %s",
+                self.node_id,
+                "leader" if is_leader else "standby",
+            )
+            for update_callback in list(self._listeners):
+                update_callback(is_leader)
+
+    def _read(self, path):
+        try:
+            with open(path, encoding="utf-8") as lease_file:
+                return json.load(lease_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{self.node_id}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as tmp_file:
+            json.dump(data, tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+
+    def _try_acquire(self):
+        """Acquire or renew the lease. Runs in the executor."""
+        now = time.time()
+        lock_path = f"{self.path}.lock"
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if now - os.path.getmtime(lock_path) > LEASE_TTL:
+                    os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            return self._is_leader
+        try:
+            os.close(fd)
+            lease = self._read(self.path)
+            if lease.get("holder") not in (None, self.node_id) and (
+                lease.get("expires", 0) > now
+            ):
+                return False
+            self._write(self.path, {"holder": self.node_id, "expires": now + LEASE_TTL})
+            return True
+        finally:
+            os.remove(lock_path)
+
+    def _refresh_claims(self):
+        """Keep the claims of active alarms fresh. Runs in the executor."""
+        for claim_path in list(self._claims):
+            if self._read(claim_path).get("node") != self.node_id:
+                _LOGGER.warning("Lost Noonlight dispatch claim %s", claim_path)
+                self._claims.discard(claim_path)
+                continue
+            os.utime(claim_path)
+
+    def _release(self):
+        lease = self._read(self.path)
+        if lease.get("holder") == self.node_id:
+            os.remove(self.path)
+
+    async def async_publish_token(self, token_response):
+        """Share a renewed token with standby nodes."""
+        data = {
+            "token": token_response.get("token"),
+            "expires": token_response["expires"].isoformat(),
+        }
+        await self.hass.async_add_executor_job(self._write, self.token_path, data)
+
+    async def async_read_token(self):
+        """Return the token last published by the leader."""
+        return await self.hass.async_add_executor_job(self._read, self.token_path)
+
+    async def async_claim_dispatch(self, alarm_key):
+        """Claim the right to dispatch an alarm, False if another node has it."""
+        return await self.hass.async_add_executor_job(self._claim, alarm_key)
+
+    def _claim(self, alarm_key):
+        claim_path = self._claim_path(alarm_key)
+        for _ in range(2):
+            try:
+                fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    age = time.time() - os.path.getmtime(claim_path)
+                    if age <= DISPATCH_CLAIM_TTL:
+                        claim = self._read(claim_path)
+                        _LOGGER.info(
+                            "Alarm %s already dispatched by node %s",
+                            alarm_key,
+                            claim.get("node"),
+                        )
+                        return False
+                    os.remove(claim_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as claim_file:
+                json.dump({"node": self.node_id, "ts": time.time()}, claim_file)
+            self._claims.add(claim_path)
+            return True
+        return False
+
+    async def async_release_dispatch(self, alarm_key):
+        """Release a dispatch claim once its alarm has ended or failed."""
+
+        def release():
+            claim_path = self._claim_path(alarm_key)
+            self._claims.discard(claim_path)
+            try:
+                os.remove(claim_path)
+            except FileNotFoundError:
+                pass
+
+        await self.hass.async_add_executor_job(release)
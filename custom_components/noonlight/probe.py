@@ -0,0 +1,163 @@
+"""Background reachability probe for the Noonlight API and token endpoints."""
+
+import asyncio
+import logging
+
+import aiohttp
+from yarl import URL
+
+from .scheduler import PRIORITY_PROBE
+
+_LOGGER = logging.getLogger(__name__)
+
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=10)
+PROBE_HEALTHY_INTERVAL = 300
+PROBE_FAILURE_INTERVALS = (5, 10, 20, 40, 60)
+# A single lost probe is retried before an endpoint is reported unreachable
+PROBE_UNREACHABLE_AFTER = 2
+# Overloaded or rate limited, but answering
+PROBE_REACHABLE_SERVER_ERRORS = (501, 503)
+# Round trip times are reported as the bucket they fall in, so the entity
+# state only changes when the latency changes noticeably
+PROBE_RTT_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def get_probe(scheduler, url):
+    """Return the probe for the origin of `url`, shared through the scheduler."""
+    origin = URL(str(url)).origin()
+    probe = scheduler.probes.get(origin)
+    if probe is None:
+        probe = scheduler.probes[origin] = NoonlightProbe(scheduler, origin)
+    return probe
+
+
+class NoonlightProbe:
+    """Periodic HEAD request to one endpoint origin over the shared session.
+
+    One probe runs per origin no matter how many sites use it, so the cost
+    is one small request per origin on an already pooled connection. Any
+    HTTP answer other than a server error counts as reachable, and so do
+    501 and 503. The origin is only reported unreachable after
+    PROBE_UNREACHABLE_AFTER probes in a row failed. Healthy origins are
+    probed rarely; after a failure the probe backs off from a few seconds up
+    to a minute until the origin recovers.
+
+    Listeners are called with (reachable, rtt_ms), where the round trip time
+    is rounded up to one of PROBE_RTT_BUCKETS_MS and is the last one
+    measured while the origin is still reported reachable. Probing runs
+    while at least one listener is registered.
+    """
+
+    def __init__(self, scheduler, origin):
+        """Initialize the probe."""
+        self._scheduler = scheduler
+        self.origin = origin
+        self.reachable = None
+        self.rtt_ms = None
+        self._listeners = []
+        self._failures = 0
+        self._cancel_next = None
+        self._task = None
+
+    def add_listener(self, listener):
+        """Register a listener and return a function that removes it."""
+        self._listeners.append(listener)
+        if len(self._listeners) == 1:
+            self._schedule(0)
+        elif self.reachable is not None:
+            listener(self.reachable, self.rtt_ms)
+
+        def remove_listener():
+            self._listeners.remove(listener)
+            if not self._listeners:
+                self._stop()
+
+        return remove_listener
+
+    def async_probe_soon(self):
+        """Probe right away, e.g. after a real request to the API failed."""
+        if self._listeners and (self._task is None or self._task.done()):
+            self._schedule(0)
+
+    def _stop(self):
+        if self._scheduler.probes.get(self.origin) is self:
+            del self._scheduler.probes[self.origin]
+        if self._cancel_next is not None:
+            self._cancel_next.cancel()
+            self._cancel_next = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _async_probe_once(self):
+        """Return the round trip time in ms, or None when unreachable.
+
+        Timing starts when the scheduler sends the request, so time spent
+        queued behind other requests or a Retry-After pause is not counted.
+        """
+        request = self._scheduler.head(
+            self.origin, priority=PRIORITY_PROBE, timeout=PROBE_TIMEOUT
+        )
+        try:
+            async with request as resp:
+                rtt = (asyncio.get_running_loop().time() - request.sent_at) * 1000.0
+                if (
+                    resp.status >= 500
+                    and resp.status not in PROBE_REACHABLE_SERVER_ERRORS
+                ):
+                    _LOGGER.debug(
+                        "Probe of %s answered HTTP %s", self.origin, resp.status
+                    )
+                    return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            _LOGGER.debug("Probe of %s failed: %s", self.origin, err)
+            return None
+        _LOGGER.debug("Probe of %s took %.1fms", self.origin, rtt)
+        return rtt
+
+    async def async_probe(self):
+        """Probe the origin, notify the listeners and schedule the next probe."""
+        self._cancel_next = None
+        rtt = await self._async_probe_once()
+        if rtt is not None:
+            if self._failures >= PROBE_UNREACHABLE_AFTER:
+                _LOGGER.info("Noonlight endpoint %s reachable again", self.origin)
+            self._failures = 0
+            self.reachable = True
+            self.rtt_ms = _rtt_bucket(rtt)
+        else:
+            self._failures += 1
+            if self._failures == PROBE_UNREACHABLE_AFTER:
+                _LOGGER.warning("Noonlight endpoint %s unreachable", self.origin)
+            if self._failures >= PROBE_UNREACHABLE_AFTER:
+                self.reachable = False
+                self.rtt_ms = None
+        for listener in list(self._listeners):
+            listener(self.reachable, self.rtt_ms)
+        if self._listeners:
+            self._schedule(
+                PROBE_HEALTHY_INTERVAL
+                if rtt is not None
+                else PROBE_FAILURE_INTERVALS[
+                    min(self._failures, len(PROBE_FAILURE_INTERVALS)) - 1
+                ]
+            )
+
+    def _schedule(self, delay):
+        if self._cancel_next is not None:
+            self._cancel_next.cancel()
+        self._cancel_next = asyncio.get_running_loop().call_later(
+            delay, self._probe_due
+        )
+
+    def _probe_due(self):
+        self._cancel_next = None
+        self._task = asyncio.get_running_loop().create_task(self.async_probe())
+
+
+def _rtt_bucket(rtt):
+    """Return the smallest bucket holding a round trip time."""
+    for bucket in PROBE_RTT_BUCKETS_MS:
+        if rtt <= bucket:
+            return bucket
+    return PROBE_RTT_BUCKETS_MS[-1]
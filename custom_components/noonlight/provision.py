@@ -0,0 +1,216 @@
+"""Bulk provisioning of Noonlight sites from a JSON or CSV file."""
+
+import asyncio
+import csv
+import json
+import logging
+import os
+
+import aiohttp
+import homeassistant.helpers.config_validation as cv
+import voluptuous as vol
+from homeassistant.const import CONF_ID, CONF_LATITUDE, CONF_LONGITUDE, CONF_NAME
+from homeassistant.core import HomeAssistant
+from homeassistant.data_entry_flow import FlowResultType
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import (
+    CONF_ADDRESS_LINE1,
+    CONF_ADDRESS_LINE2,
+    CONF_API_ENDPOINT,
+    CONF_CITY,
+    CONF_LEASE_PATH,
+    CONF_LOCATION_MODE,
+    CONF_PIN,
+    CONF_RELAY,
+    CONF_SECRET,
+    CONF_STATE,
+    CONF_TOKEN_ENDPOINT,
+    CONF_ZIP,
+    DEFAULT_API_ENDPOINT,
+    DEFAULT_NAME,
+    DEFAULT_TOKEN_ENDPOINT,
+    DOMAIN,
+    SOURCE_PROVISION,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+PROVISION_PARALLELISM = 8
+PROVISION_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+RESULT_CREATED = "created"
+RESULT_UPDATED = "updated"
+RESULT_UNCHANGED = "unchanged"
+RESULT_INVALID = "invalid"
+RESULT_AUTH_FAILED = "auth_failed"
+RESULT_CANNOT_CONNECT = "cannot_connect"
+
+SITE_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Required(CONF_ID): cv.string,
+            vol.Required(CONF_SECRET): cv.string,
+            vol.Optional(CONF_NAME): cv.string,
+            vol.Optional(CONF_API_ENDPOINT): cv.url,
+            vol.Optional(CONF_TOKEN_ENDPOINT): cv.url,
+            vol.Inclusive(CONF_ADDRESS_LINE1, "address"): cv.string,
+            vol.Optional(CONF_ADDRESS_LINE2): cv.string,
+            vol.Inclusive(CONF_CITY, "address"): cv.string,
+            vol.Inclusive(CONF_STATE, "address"): vol.All(cv.string, vol.Upper),
+            vol.Inclusive(CONF_ZIP, "address"): cv.string,
+            vol.Inclusive(CONF_LATITUDE, "coordinates"): cv.latitude,
+            vol.Inclusive(CONF_LONGITUDE, "coordinates"): cv.longitude,
+            vol.Optional(CONF_LEASE_PATH): cv.string,
+            vol.Optional(CONF_PIN): cv.string,
+            vol.Optional(CONF_RELAY): cv.boolean,
+        }
+    ),
+    cv.has_at_least_one_key(CONF_ADDRESS_LINE1, CONF_LATITUDE),
+)
+
+
+def _load_sites(path):
+    """Read site rows from a JSON list or a CSV file with a header row."""
+    with open(path, encoding="utf-8", newline="") as sites_file:
+        if os.path.splitext(path)[1].lower() == ".json":
+            rows = json.load(sites_file)
+            if isinstance(rows, dict):
+                rows = rows.get("sites", [])
+            if not isinstance(rows, list):
+                raise ValueError("JSON site file must contain a list of sites")
+            return rows
+        return [
+            {
+                key: value
+                for key, value in row.items()
+                if key and value not in ("", None)
+            }
+            for row in csv.DictReader(sites_file)
+        ]
+
+
+def _site_data(site, entry=None):
+    """Build config entry data for a validated site row.
+
+    The row is merged into the data of an existing entry, so settings it
+    leaves out, like a PIN or the relay option, are kept.
+    """
+    if entry is None:
+        data = {
+            CONF_NAME: f"{DEFAULT_NAME} {site[CONF_ID]}",
+            CONF_API_ENDPOINT: DEFAULT_API_ENDPOINT,
+            CONF_TOKEN_ENDPOINT: DEFAULT_TOKEN_ENDPOINT,
+        }
+    else:
+        data = dict(entry.data)
+    if CONF_ADDRESS_LINE1 in site:
+        for key in (CONF_LATITUDE, CONF_LONGITUDE, CONF_ADDRESS_LINE2):
+            data.pop(key, None)
+        data[CONF_LOCATION_MODE] = "address"
+    else:
+        for key in (
+            CONF_ADDRESS_LINE1,
+            CONF_ADDRESS_LINE2,
+            CONF_CITY,
+            CONF_STATE,
+            CONF_ZIP,
+        ):
+            data.pop(key, None)
+        data[CONF_LOCATION_MODE] = "latlong"
+    data.update(site)
+    return data
+
+
+def _find_entry(hass: HomeAssistant, site_id):
+    """Return the config entry already set up for a Noonlight id."""
+    for entry in hass.config_entries.async_entries(DOMAIN):
+        if entry.unique_id == site_id or entry.data.get(CONF_ID) == site_id:
+            return entry
+    return None
+
+
+async def _async_validate_credentials(session, semaphore, site):
+    """Request a token for the site, returning an error code or None."""
+    async with semaphore:
+        try:
+            async with session.post(
+                site[CONF_TOKEN_ENDPOINT],
+                json={"id": site[CONF_ID], "secret": site[CONF_SECRET]},
+                headers={"Content-Type": "application/json"},
+                timeout=PROVISION_TIMEOUT,
+            ) as resp:
+                if resp.status in (401, 403):
+                    return RESULT_AUTH_FAILED
+                token_response = await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            _LOGGER.debug("Token request for %s failed: %s", site[CONF_ID], err)
+            return RESULT_CANNOT_CONNECT
+        except ValueError:
+            return RESULT_AUTH_FAILED
+    if not isinstance(token_response, dict) or "token" not in token_response:
+        return RESULT_AUTH_FAILED
+    return None
+
+
+async def async_provision_sites(
+    hass: HomeAssistant, path, parallelism=PROVISION_PARALLELISM
+):
+    """Validate every site in the file and create or update its config entry.
+
+    Credentials are checked against each site's token endpoint with at most
+    `parallelism` requests in flight. Returns one report row per site.
+    """
+    rows = await hass.async_add_executor_job(_load_sites, path)
+    report = [{"row": index + 1} for index in range(len(rows))]
+    sites = {}
+    entries = {}
+    for index, row in enumerate(rows):
+        try:
+            site = SITE_SCHEMA(row)
+        except vol.Invalid as err:
+            report[index].update(result=RESULT_INVALID, error=str(err))
+            continue
+        report[index]["id"] = site[CONF_ID]
+        entries[index] = _find_entry(hass, site[CONF_ID])
+        sites[index] = _site_data(site, entries[index])
+
+    session = async_get_clientsession(hass)
+    semaphore = asyncio.Semaphore(parallelism)
+    errors = await asyncio.gather(
+        *(
+            _async_validate_credentials(session, semaphore, site)
+            for site in sites.values()
+        )
+    )
+
+    for (index, data), error in zip(sites.items(), errors):
+        if error is not None:
+            report[index]["result"] = error
+            continue
+        entry = entries[index]
+        if entry is None:
+            result = await hass.config_entries.flow.async_init(
+                DOMAIN, context={"source": SOURCE_PROVISION}, data=data
+            )
+            if result["type"] != FlowResultType.CREATE_ENTRY:
+                report[index].update(result=RESULT_INVALID, error=result.get("reason"))
+                continue
+            report[index]["result"] = RESULT_CREATED
+            report[index]["entry_id"] = result["result"].entry_id
+        elif dict(entry.data) == data:
+            report[index]["result"] = RESULT_UNCHANGED
+            report[index]["entry_id"] = entry.entry_id
+        else:
+            hass.config_entries.async_update_entry(
+                entry, data=data, unique_id=data[CONF_ID]
+            )
+            report[index]["result"] = RESULT_UPDATED
+            report[index]["entry_id"] = entry.entry_id
+
+    _LOGGER.info(
+        "Provisioned %s Noonlight site(s) from %s",
+        sum(1 for row in report if row["result"] in (RESULT_CREATED, RESULT_UPDATED)),
+        path,
+    )
+    return report
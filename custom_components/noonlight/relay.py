@@ -0,0 +1,442 @@
+"""Relay that multiplexes many Home Assistant instances onto one connection pool.
+
+The relay is a standalone asyncio service that only depends on aiohttp, so it
+can run next to (or away from) Home Assistant:
+
+    python relay.py --port 8780
+
+Point the integration's API endpoint at ``http://<relay>:8780/api`` and its
+token endpoint at ``http://<relay>:8780/token``, and enable relay mode. The
+relay only listens on localhost by default. To serve other hosts, pass
+``--host 0.0.0.0 --secret <secret>``; every path then starts with the secret,
+e.g. ``http://<relay>:8780/<secret>/api``. The relay then:
+
+* forwards API calls over a single pooled, keep-alive session,
+* caches tokens per Noonlight id until shortly before they expire,
+* coalesces status polls for the same alarm into one upstream request, and
+* polls each subscribed alarm once per token and pushes status changes to
+  every subscriber using that token over a websocket at ``/api/relay/ws``.
+
+RelaySubscriber is the client side used by the integration.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+from aiohttp import web
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8780
+DEFAULT_API_ENDPOINT = "https://api.noonlight.com/platform/v1"
+DEFAULT_TOKEN_ENDPOINT = "https://noonlight.konnected.io/ha/token"
+DEFAULT_POLL_INTERVAL = 15
+TOKEN_REFRESH_MARGIN = timedelta(minutes=10)
+SUBSCRIBER_RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+STATUS_CACHE_SIZE = 1000
+
+STATUS_CANCELED = "CANCELED"
+HOP_BY_HOP_HEADERS = ("connection", "keep-alive", "transfer-encoding", "host")
+
+
+def _parse_expires(value):
+    try:
+        expires = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires
+
+
+class NoonlightRelay:
+    """Relay server holding the shared upstream session, tokens and polls."""
+
+    def __init__(
+        self,
+        api_endpoint=DEFAULT_API_ENDPOINT,
+        token_endpoint=DEFAULT_TOKEN_ENDPOINT,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        secret=None,
+    ):
+        """Initialize the relay."""
+        self.api_endpoint = api_endpoint.rstrip("/")
+        self.token_endpoint = token_endpoint
+        self.poll_interval = poll_interval
+        self.secret = secret
+        self._session = None
+        self._tokens = {}
+        self._token_requests = {}
+        self._status_cache = {}
+        self._status_requests = {}
+        self._subscriptions = {}
+        self._pollers = {}
+
+    def build_app(self):
+        """Return the aiohttp application serving the relay."""
+        app = web.Application(middlewares=[self._check_secret])
+        prefix = "/{relay_secret}" if self.secret else ""
+        app.router.add_post(f"{prefix}/token", self.handle_token)
+        app.router.add_get(f"{prefix}/api/relay/ws", self.handle_websocket)
+        app.router.add_get(
+            f"{prefix}/api/alarms/{{alarm_id}}/status", self.handle_status
+        )
+        app.router.add_route("*", f"{prefix}/api/{{tail:.*}}", self.handle_proxy)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    @web.middleware
+    async def _check_secret(self, request, handler):
+        """Answer 404 unless the path starts with the relay secret."""
+        if self.secret and not hmac.compare_digest(
+            request.match_info.get("relay_secret", "").encode(), self.secret.encode()
+        ):
+            raise web.HTTPNotFound()
+        return await handler(request)
+
+    async def _on_startup(self, app):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+
+    async def _on_cleanup(self, app):
+        for poller in self._pollers.values():
+            poller.cancel()
+        await self._session.close()
+
+    async def _coalesce(self, requests, key, factory):
+        """Share one in-flight request among all callers with the same key."""
+        future = requests.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            requests[key] = future
+            future.add_done_callback(lambda _: requests.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def handle_token(self, request):
+        """Return a cached token, renewing it upstream when close to expiry."""
+        data = await request.json()
+        key = (
+            data.get("id"),
+            hashlib.sha256(str(data.get("secret")).encode()).hexdigest(),
+        )
+        cached = self._tokens.get(key)
+        if cached is not None:
+            expires = _parse_expires(cached.get("expires"))
+            if expires is not None and expires - TOKEN_REFRESH_MARGIN > datetime.now(
+                timezone.utc
+            ):
+                return web.json_response(cached)
+
+        async def renew():
+            async with self._session.post(self.token_endpoint, json=data) as resp:
+                return resp.status, await resp.json(content_type=None)
+
+        status, token_response = await self._coalesce(self._token_requests, key, renew)
+        if status == 200 and "token" in token_response:
+            self._tokens[key] = token_response
+        return web.json_response(token_response, status=status)
+
+    async def _fetch_status(self, alarm_id, authorization):
+        """Fetch an alarm status upstream, sharing recent and in-flight polls."""
+        key = (alarm_id, authorization)
+        loop = asyncio.get_running_loop()
+        cached = self._status_cache.get(key)
+        if cached is not None and cached[0] > loop.time():
+            return cached[1], cached[2]
+
+        async def fetch():
+            async with self._session.get(
+                f"{self.api_endpoint}/alarms/{alarm_id}/status",
+                headers={"Authorization": authorization},
+            ) as resp:
+                return resp.status, await resp.json(content_type=None)
+
+        status, body = await self._coalesce(self._status_requests, key, fetch)
+        now = loop.time()
+        if len(self._status_cache) > STATUS_CACHE_SIZE:
+            for stale in [k for k, v in self._status_cache.items() if v[0] <= now]:
+                self._status_cache.pop(stale)
+        self._status_cache[key] = (now + self.poll_interval / 2, status, body)
+        return status, body
+
+    async def handle_status(self, request):
+        """Answer an alarm status poll from the shared cache."""
+        status, body = await self._fetch_status(
+            request.match_info["alarm_id"], request.headers.get("Authorization", "")
+        )
+        return web.json_response(body, status=status)
+
+    async def handle_proxy(self, request):
+        """Forward any other API call over the pooled session."""
+        headers = {
+            name: value
+            for name, value in request.headers.items()
+            if name.lower() not in HOP_BY_HOP_HEADERS
+        }
+        async with self._session.request(
+            request.method,
+            f"{self.api_endpoint}/{request.match_info['tail']}",
+            headers=headers,
+            params=request.query,
+            data=await request.read(),
+        ) as resp:
+            body = await resp.read()
+            if request.method == "PUT" and request.match_info["tail"].endswith(
+                "/status"
+            ):
+                # A cancel invalidates any cached status for the alarm
+                alarm_id = request.match_info["tail"].split("/")[-2]
+                for key in [k for k in self._status_cache if k[0] == alarm_id]:
+                    self._status_cache.pop(key, None)
+            return web.Response(
+                body=body, status=resp.status, content_type=resp.content_type
+            )
+
+    async def handle_websocket(self, request):
+        """Push status changes of subscribed alarms to a Home Assistant instance.
+
+        Subscriptions are kept per alarm and token, so a client only receives
+        statuses fetched with its own token.
+        """
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        subscribed = {}
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                message = json.loads(msg.data)
+                alarm_id = message.get("alarm_id")
+                if not alarm_id or message.get("type") not in (
+                    "subscribe",
+                    "unsubscribe",
+                ):
+                    continue
+                if alarm_id in subscribed:
+                    self._unsubscribe(subscribed.pop(alarm_id), ws)
+                if message["type"] == "subscribe":
+                    key = (alarm_id, message.get("authorization", ""))
+                    subscribed[alarm_id] = key
+                    self._subscribe(key, ws)
+        finally:
+            for key in subscribed.values():
+                self._unsubscribe(key, ws)
+        return ws
+
+    def _subscribe(self, key, ws):
+        subscription = self._subscriptions.setdefault(
+            key, {"clients": set(), "last": None}
+        )
+        subscription["clients"].add(ws)
+        if subscription["last"] is not None:
+            asyncio.ensure_future(self._send(ws, key[0], subscription["last"]))
+        if key not in self._pollers:
+            self._pollers[key] = asyncio.ensure_future(self._poll(key))
+
+    def _unsubscribe(self, key, ws):
+        subscription = self._subscriptions.get(key)
+        if subscription is None:
+            return
+        subscription["clients"].discard(ws)
+        if not subscription["clients"]:
+            self._subscriptions.pop(key)
+            poller = self._pollers.pop(key, None)
+            if poller is not None:
+                poller.cancel()
+
+    async def _send(self, ws, alarm_id, alarm_status):
+        try:
+            await ws.send_json(
+                {"type": "status", "alarm_id": alarm_id, "status": alarm_status}
+            )
+        except (ConnectionResetError, RuntimeError):
+            pass
+
+    async def _poll(self, key):
+        """Poll one alarm for all subscribers sharing a token until it ends."""
+        alarm_id, authorization = key
+        try:
+            while key in self._subscriptions:
+                subscription = self._subscriptions[key]
+                try:
+                    status, body = await self._fetch_status(alarm_id, authorization)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+                    _LOGGER.warning(
+                        "Status poll for alarm %s failed: %s", alarm_id, err
+                    )
+                else:
+                    if status in (401, 403):
+                        # Subscribers resubscribe with their renewed token
+                        _LOGGER.info(
+                            "Token rejected for alarm %s, not polling", alarm_id
+                        )
+                        self._subscriptions.pop(key, None)
+                        break
+                    alarm_status = (
+                        body.get("status")
+                        if status == 200 and isinstance(body, dict)
+                        else None
+                    )
+                    if (
+                        alarm_status is not None
+                        and alarm_status != subscription["last"]
+                    ):
+                        subscription["last"] = alarm_status
+                        await asyncio.gather(
+                            *(
+                                self._send(ws, alarm_id, alarm_status)
+                                for ws in list(subscription["clients"])
+                            )
+                        )
+                    if alarm_status == STATUS_CANCELED:
+                        self._subscriptions.pop(key, None)
+                        break
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            # A poller that ended for any reason must not block a new one
+            if self._pollers.get(key) is asyncio.current_task():
+                self._pollers.pop(key)
+
+
+class RelaySubscriber:
+    """Persistent websocket connection from the integration to a relay.
+
+    Keeps the subscribed alarms across reconnects and calls `on_status` with
+    (alarm_id, status) for every status pushed by the relay. `on_connection`
+    is called with True or False whenever the connection comes up or drops,
+    so the caller can poll on its own while nothing is being pushed.
+    """
+
+    def __init__(self, session, url, on_status, on_connection=None):
+        """Initialize the subscriber."""
+        self._session = session
+        self._url = url
+        self._on_status = on_status
+        self._on_connection = on_connection
+        self._subscriptions = {}
+        self._ws = None
+        self._task = None
+
+    @property
+    def connected(self):
+        """Return True while connected to the relay."""
+        return self._ws is not None and not self._ws.closed
+
+    def start(self):
+        """Connect in the background and stay connected."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Disconnect from the relay."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+
+    async def subscribe(self, alarm_id, token):
+        """Ask the relay to push status changes for an alarm."""
+        self._subscriptions[alarm_id] = f"Bearer {token}"
+        await self._send_subscribe(alarm_id)
+
+    async def unsubscribe(self, alarm_id):
+        """Stop receiving status changes for an alarm."""
+        if self._subscriptions.pop(alarm_id, None) is not None and self._ws:
+            try:
+                await self._ws.send_json({"type": "unsubscribe", "alarm_id": alarm_id})
+            except (ConnectionResetError, RuntimeError):
+                pass
+
+    async def set_token(self, token):
+        """Re-send subscriptions with a renewed token."""
+        for alarm_id in self._subscriptions:
+            self._subscriptions[alarm_id] = f"Bearer {token}"
+            await self._send_subscribe(alarm_id)
+
+    async def _send_subscribe(self, alarm_id):
+        if self._ws is None or self._ws.closed:
+            return
+        try:
+            await self._ws.send_json(
+                {
+                    "type": "subscribe",
+                    "alarm_id": alarm_id,
+                    "authorization": self._subscriptions[alarm_id],
+                }
+            )
+        except (ConnectionResetError, RuntimeError):
+            pass
+
+    def _connection_changed(self, connected):
+        if self._on_connection is not None:
+            self._on_connection(connected)
+
+    async def _run(self):
+        attempt = 0
+        while True:
+            try:
+                async with self._session.ws_connect(self._url, heartbeat=30) as ws:
+                    self._ws = ws
+                    attempt = 0
+                    _LOGGER.debug("Connected to Noonlight relay at %s", self._url)
+                    for alarm_id in list(self._subscriptions):
+                        await self._send_subscribe(alarm_id)
+                    self._connection_changed(True)
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            continue
+                        message = json.loads(msg.data)
+                        if message.get("type") == "status":
+                            await self._on_status(
+                                message.get("alarm_id"), message.get("status")
+                            )
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+                _LOGGER.warning("Noonlight relay connection failed: %s", err)
+            if self._ws is not None:
+                self._ws = None
+                self._connection_changed(False)
+            delay = SUBSCRIBER_RECONNECT_DELAYS[
+                min(attempt, len(SUBSCRIBER_RECONNECT_DELAYS) - 1)
+            ]
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+def main():
+    """Run the relay from the command line."""
+    parser = argparse.ArgumentParser(description="Noonlight relay for Home Assistant")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--api-endpoint", default=DEFAULT_API_ENDPOINT)
+    parser.add_argument("--token-endpoint", default=DEFAULT_TOKEN_ENDPOINT)
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument(
+        "--secret",
+        default=os.environ.get("NOONLIGHT_RELAY_SECRET"),
+        help="path prefix clients must use, required unless bound to localhost",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if not args.secret and args.host not in ("127.0.0.1", "::1", "localhost"):
+        parser.error("--secret is required when listening on other hosts")
+    relay = NoonlightRelay(
+        args.api_endpoint, args.token_endpoint, args.poll_interval, args.secret
+    )
+    web.run_app(relay.build_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
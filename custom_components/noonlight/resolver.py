@@ -0,0 +1,238 @@
+"""Persistent DNS cache for the Noonlight endpoints."""
+
+import asyncio
+import logging
+import socket
+import time
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import ThreadedResolver
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import ssl as ssl_util
+from yarl import URL
+
+from .const import DATA_DNS_SESSION
+
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+
+_LOGGER = logging.getLogger(__name__)
+
+DNS_STORAGE_KEY = "noonlight.dns"
+DNS_STORAGE_VERSION = 1
+DNS_SAVE_DELAY = 30
+DNS_DEFAULT_TTL = 300
+DNS_MIN_TTL = 30
+DNS_MAX_TTL = 3600
+# Refresh watched hosts when this fraction of their TTL is left
+DNS_REFRESH_MARGIN = 0.1
+
+
+class NoonlightResolver(AbstractResolver):
+    """aiohttp resolver that serves addresses from a cache.
+
+    Fresh entries are answered without a lookup. Expired entries are answered
+    right away too, while a lookup runs in the background, so a slow or
+    failing DNS server only delays the very first connection to a host.
+    Watched hosts are looked up again in the background shortly before they
+    expire.
+    New entries are cached for DNS_DEFAULT_TTL; when aiodns is installed the
+    TTL the DNS server reports replaces it in the background, as the system
+    resolver does not report TTLs. Only the address lookup is replaced: aiohttp still connects
+    with the original hostname, so TLS SNI and certificate checks are unchanged.
+    """
+
+    def __init__(self, cache=None, on_update=None, resolver=None):
+        """Initialize the resolver."""
+        self._resolver = resolver or ThreadedResolver()
+        self._cache = dict(cache or {})
+        self._on_update = on_update
+        self._watched = set()
+        self._timers = {}
+        self._lookups = {}
+        self._refreshes = {}
+        self._ttl_queries = {}
+        self._dns = None
+
+    @property
+    def cache(self):
+        """Return the cache in its persisted form."""
+        return self._cache
+
+    def load(self, cache):
+        """Merge persisted entries, keeping any newer ones already resolved."""
+        for host, entry in cache.items():
+            if entry.get("expires", 0) > self._cache.get(host, {}).get("expires", 0):
+                self._cache[host] = entry
+        for host in self._watched:
+            self._schedule_refresh(host)
+
+    def watch(self, host):
+        """Keep the addresses of a host fresh in the background."""
+        if host is None or host in self._watched:
+            return
+        self._watched.add(host)
+        self._schedule_refresh(host)
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        """Return the addresses of a host, from the cache when possible."""
+        entry = self._cache.get(host)
+        if entry is None:
+            entry = await self._lookup(host)
+        elif entry["expires"] <= time.time():
+            _LOGGER.debug("Using expired addresses of %s while refreshing", host)
+            self._start_refresh(host)
+        return [
+            {
+                "hostname": host,
+                "host": address,
+                "port": port,
+                "family": address_family,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+            }
+            for address_family, address in entry["addresses"]
+            if family in (socket.AF_UNSPEC, address_family)
+        ]
+
+    async def close(self):
+        """Stop the background refreshes and close the wrapped resolver."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in (*self._refreshes.values(), *self._ttl_queries.values()):
+            task.cancel()
+        await self._resolver.close()
+
+    async def _lookup(self, host):
+        """Resolve a host once, sharing the result with concurrent callers."""
+        if host not in self._lookups:
+            self._lookups[host] = asyncio.ensure_future(self._async_lookup(host))
+        try:
+            return await asyncio.shield(self._lookups[host])
+        finally:
+            if host in self._lookups and self._lookups[host].done():
+                del self._lookups[host]
+
+    async def _async_lookup(self, host):
+        results = await self._resolver.resolve(host, 0, socket.AF_UNSPEC)
+        addresses = []
+        for result in results:
+            address = [result["family"], result["host"]]
+            if address not in addresses:
+                addresses.append(address)
+        if not addresses:
+            raise OSError(f"No addresses found for {host}")
+        entry = {"addresses": addresses, "expires": time.time() + DNS_DEFAULT_TTL}
+        self._store(host, entry)
+        if aiodns is not None and host not in self._ttl_queries:
+            task = asyncio.ensure_future(self._refine_ttl(host, entry))
+            self._ttl_queries[host] = task
+            task.add_done_callback(lambda _: self._ttl_queries.pop(host, None))
+        return entry
+
+    def _store(self, host, entry):
+        self._cache[host] = entry
+        if self._on_update is not None:
+            self._on_update()
+        if host in self._watched:
+            self._schedule_refresh(host)
+
+    async def _refine_ttl(self, host, entry):
+        """Expire a new entry after the TTL reported by the DNS server."""
+        if self._dns is None:
+            self._dns = aiodns.DNSResolver()
+        try:
+            records = await self._dns.query(host, "A")
+            ttl = min(record.ttl for record in records)
+        except (aiodns.error.DNSError, ValueError):
+            return
+        if self._cache.get(host) is entry:
+            ttl = min(max(ttl, DNS_MIN_TTL), DNS_MAX_TTL)
+            self._store(host, {**entry, "expires": time.time() + ttl})
+
+    def _schedule_refresh(self, host):
+        if host in self._timers:
+            self._timers.pop(host).cancel()
+        entry = self._cache.get(host)
+        delay = 0.0
+        if entry is not None:
+            remaining = entry["expires"] - time.time()
+            delay = max(remaining - max(remaining * DNS_REFRESH_MARGIN, 1.0), 0.0)
+        self._timers[host] = asyncio.get_running_loop().call_later(
+            delay, self._start_refresh, host
+        )
+
+    def _start_refresh(self, host):
+        if host in self._refreshes:
+            return
+        task = asyncio.ensure_future(self._refresh(host))
+        self._refreshes[host] = task
+        task.add_done_callback(lambda _: self._refreshes.pop(host, None))
+
+    async def _refresh(self, host):
+        timer = self._timers.pop(host, None)
+        if timer is not None:
+            timer.cancel()
+        try:
+            await self._lookup(host)
+        except (OSError, asyncio.TimeoutError) as err:
+            entry = self._cache.get(host)
+            _LOGGER.log(
+                (
+                    logging.WARNING
+                    if entry is not None and entry["expires"] <= time.time()
+                    else logging.DEBUG
+                ),
+                "DNS lookup of %s failed (%s), using last known addresses",
+                host,
+                err,
+            )
+            if host in self._watched:
+                self._timers[host] = asyncio.get_running_loop().call_later(
+                    DNS_MIN_TTL, self._start_refresh, host
+                )
+
+
+async def async_get_dns_session(hass: HomeAssistant, urls=()):
+    """Return the shared session resolving through the persistent DNS cache.
+
+    The hosts of `urls` are watched, so their addresses are kept fresh.
+    """
+    data = hass.data.get(DATA_DNS_SESSION)
+    if data is None:
+        store = Store(hass, DNS_STORAGE_VERSION, DNS_STORAGE_KEY)
+        resolver = NoonlightResolver(
+            on_update=lambda: store.async_delay_save(
+                lambda: resolver.cache, DNS_SAVE_DELAY
+            )
+        )
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                resolver=resolver, ssl=ssl_util.get_default_context()
+            )
+        )
+
+        async def load():
+            resolver.load(await store.async_load() or {})
+
+        async def close(event):
+            await session.close()
+            await resolver.close()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, close)
+        data = hass.data[DATA_DNS_SESSION] = (
+            session,
+            resolver,
+            hass.async_create_task(load()),
+        )
+    session, resolver, loaded = data
+    await asyncio.shield(loaded)
+    for url in urls:
+        resolver.watch(URL(url).host)
+    return session
@@ -0,0 +1,288 @@
+"""Priority-aware scheduler for outbound Noonlight API requests."""
+
+import asyncio
+import heapq
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from itertools import count
+
+from yarl import URL
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_DISPATCH = 0
+PRIORITY_CANCEL = 1
+PRIORITY_LOCATION = 2
+PRIORITY_STATUS = 3
+PRIORITY_TOKEN = 4
+PRIORITY_PROBE = 5
+
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_RETRY_AFTER = 5.0
+
+_request_priority = ContextVar("noonlight_request_priority", default=PRIORITY_STATUS)
+
+
+def _parse_retry_after(value):
+    """Return the number of seconds requested by a Retry-After header."""
+    if value is None:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class NoonlightRequestScheduler:
+    """Rate limited, priority ordered front for the shared aiohttp session.
+
+    Exposes the subset of the aiohttp.ClientSession interface used by the
+    noonlight client, so it can be handed to NoonlightClient as its session.
+    One scheduler is shared by every site, with separate limits per endpoint
+    origin. Waiting requests are granted in priority order, a token bucket
+    caps the request rate and a 429/503 with Retry-After pauses every class
+    except dispatch. One concurrency slot is always kept free for dispatch.
+    A slot is held until the response has been released.
+    """
+
+    def __init__(
+        self,
+        session,
+        rate=DEFAULT_RATE,
+        burst=DEFAULT_BURST,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    ):
+        """Initialize the scheduler."""
+        self._session = session
+        self._rate = rate
+        self._burst = burst
+        self._max_concurrency = max_concurrency
+        self._lanes = {}
+        self._seq = count()
+        # Reachability probes shared by every site, keyed by origin
+        self.probes = {}
+
+    def __getattr__(self, name):
+        """Delegate everything else to the wrapped session."""
+        return getattr(self._session, name)
+
+    @contextmanager
+    def priority(self, priority):
+        """Run requests made inside this block at the given priority."""
+        reset_token = _request_priority.set(priority)
+        try:
+            yield
+        finally:
+            _request_priority.reset(reset_token)
+
+    def request(self, method, url, priority=None, **kwargs):
+        """Schedule a request, usable with `await` or `async with`."""
+        if priority is None:
+            priority = _request_priority.get()
+        return _ScheduledRequest(self, self._lane(url), priority, method, url, kwargs)
+
+    def get(self, url, **kwargs):
+        """Schedule a GET request."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Schedule a POST request."""
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        """Schedule a PUT request."""
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        """Schedule a PATCH request."""
+        return self.request("PATCH", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """Schedule a DELETE request."""
+        return self.request("DELETE", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        """Schedule a HEAD request."""
+        return self.request("HEAD", url, **kwargs)
+
+    def options(self, url, **kwargs):
+        """Schedule an OPTIONS request."""
+        return self.request("OPTIONS", url, **kwargs)
+
+    def _lane(self, url):
+        """Return the limits and queue of the endpoint serving a URL."""
+        origin = URL(str(url)).origin()
+        lane = self._lanes.get(origin)
+        if lane is None:
+            lane = self._lanes[origin] = _Lane(self._burst)
+        return lane
+
+    def _refill(self, lane, now):
+        if lane.last_refill is not None:
+            lane.tokens = min(
+                float(self._burst),
+                lane.tokens + (now - lane.last_refill) * self._rate,
+            )
+        lane.last_refill = now
+
+    def _delay_for(self, lane, priority, now):
+        """Return seconds until a request of this priority may start, or 0."""
+        if priority == PRIORITY_DISPATCH:
+            return 0.0 if lane.in_flight < self._max_concurrency else None
+        if lane.in_flight >= self._max_concurrency - 1:
+            return None
+        if now < lane.paused_until:
+            return lane.paused_until - now
+        if lane.tokens < 1:
+            return (1 - lane.tokens) / self._rate
+        return 0.0
+
+    def _grant(self, lane):
+        lane.in_flight += 1
+        lane.tokens = max(lane.tokens - 1, 0.0)
+
+    async def _acquire(self, lane, priority):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._refill(lane, now)
+        if not lane.waiters and self._delay_for(lane, priority, now) == 0:
+            self._grant(lane)
+            return
+        future = loop.create_future()
+        heapq.heappush(lane.waiters, (priority, next(self._seq), future))
+        if priority > PRIORITY_DISPATCH:
+            _LOGGER.debug(
+                "Queued request at priority %s behind %s waiting",
+                priority,
+                len(lane.waiters) - 1,
+            )
+        self._wake(lane)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(lane)
+            raise
+
+    def _release(self, lane):
+        lane.in_flight -= 1
+        self._wake(lane)
+
+    def _wake(self, lane):
+        """Grant queued requests in priority order while capacity allows."""
+        if lane.wake_handle is not None:
+            lane.wake_handle.cancel()
+            lane.wake_handle = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._refill(lane, now)
+        while lane.waiters:
+            priority, _, future = lane.waiters[0]
+            if future.done():
+                heapq.heappop(lane.waiters)
+                continue
+            delay = self._delay_for(lane, priority, now)
+            if delay is None:
+                return
+            if delay > 0:
+                lane.wake_handle = loop.call_later(delay, self._wake, lane)
+                return
+            heapq.heappop(lane.waiters)
+            self._grant(lane)
+            future.set_result(None)
+
+    def _observe(self, lane, response):
+        """Honor Retry-After on throttled responses."""
+        if response.status not in (429, 503):
+            return
+        delay = _parse_retry_after(response.headers.get("Retry-After"))
+        loop = asyncio.get_running_loop()
+        lane.paused_until = max(lane.paused_until, loop.time() + delay)
+        _LOGGER.warning(
+            "Noonlight API throttled (HTTP %s), pausing non-emergency requests "
+            "for %.1fs",
+            response.status,
+            delay,
+        )
+
+
+class _Lane:
+    """Rate limit, pause and queue state of one endpoint origin."""
+
+    __slots__ = (
+        "tokens",
+        "last_refill",
+        "paused_until",
+        "in_flight",
+        "waiters",
+        "wake_handle",
+    )
+
+    def __init__(self, burst):
+        self.tokens = float(burst)
+        self.last_refill = None
+        self.paused_until = 0.0
+        self.in_flight = 0
+        self.waiters = []
+        self.wake_handle = None
+
+
+class _ScheduledRequest:
+    """Pending request that waits for its turn before hitting the session.
+
+    `sent_at` is the loop time the request left the queue, or None before.
+    """
+
+    def __init__(self, scheduler, lane, priority, method, url, kwargs):
+        self._scheduler = scheduler
+        self._lane = lane
+        self._priority = priority
+        self._method = method
+        self._url = url
+        self._kwargs = kwargs
+        self._response = None
+        self.sent_at = None
+
+    async def _send(self):
+        """Send the request once granted, keeping its slot on success."""
+        await self._scheduler._acquire(self._lane, self._priority)
+        self.sent_at = asyncio.get_running_loop().time()
+        try:
+            self._response = await self._scheduler._session.request(
+                self._method, self._url, **self._kwargs
+            )
+        except BaseException:
+            self._scheduler._release(self._lane)
+            raise
+        self._scheduler._observe(self._lane, self._response)
+        return self._response
+
+    async def _read(self):
+        """Send the request and read the body before giving up the slot."""
+        response = await self._send()
+        try:
+            await response.read()
+        finally:
+            response.release()
+            self._scheduler._release(self._lane)
+        return response
+
+    def __await__(self):
+        return self._read().__await__()
+
+    async def __aenter__(self):
+        return await self._send()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._response.release()
+        self._scheduler._release(self._lane)
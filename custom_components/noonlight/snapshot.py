@@ -0,0 +1,116 @@
+"""Immutable snapshots of the Noonlight integration state."""
+
+from types import MappingProxyType
+
+_EMPTY_ATTRIBUTES = MappingProxyType({})
+
+LIFECYCLE_CREATED = "created"
+LIFECYCLE_STATUS_CHANGED = "status_changed"
+LIFECYCLE_CANCELED = "canceled"
+LIFECYCLE_LOCATION_UPDATED = "location_updated"
+
+
+def lifecycle_event(old, new):
+    """Return the alarm lifecycle event between two snapshots, if any."""
+    if new.alarm_id != old.alarm_id:
+        return LIFECYCLE_CREATED if new.alarm_id is not None else LIFECYCLE_CANCELED
+    if new.alarm_id is not None and (
+        new.alarm_status != old.alarm_status or new.alarm_active != old.alarm_active
+    ):
+        return LIFECYCLE_STATUS_CHANGED
+    return None
+
+
+class NoonlightSnapshot:
+    """Point-in-time view of the token and alarm state read by entities.
+
+    A new snapshot is built only when something changes, so entity property
+    reads are plain attribute lookups with nothing to compute or allocate.
+    """
+
+    __slots__ = (
+        "token_valid",
+        "alarm_active",
+        "alarm_status",
+        "alarm_id",
+        "alarm_services",
+        "api_reachable",
+        "token_endpoint_reachable",
+        "api_rtt_ms",
+        "attributes",
+    )
+
+    def __init__(
+        self,
+        token_valid=False,
+        alarm_active=False,
+        alarm_status=None,
+        alarm_id=None,
+        alarm_services=(),
+        api_reachable=None,
+        token_endpoint_reachable=None,
+        api_rtt_ms=None,
+    ):
+        """Initialize the snapshot."""
+        attributes = {}
+        if alarm_id is not None:
+            attributes.update(
+                alarm_status=alarm_status,
+                alarm_id=alarm_id,
+                alarm_services=list(alarm_services),
+            )
+        if api_reachable is not None:
+            if not api_reachable:
+                reachability = "api_unreachable"
+            elif not token_endpoint_reachable:
+                reachability = "token_endpoint_unreachable"
+            else:
+                reachability = "ok"
+            attributes.update(reachability=reachability, api_rtt_ms=api_rtt_ms)
+        attributes = MappingProxyType(attributes) if attributes else _EMPTY_ATTRIBUTES
+        for name, value in (
+            ("token_valid", token_valid),
+            ("alarm_active", alarm_active),
+            ("alarm_status", alarm_status),
+            ("alarm_id", alarm_id),
+            ("alarm_services", tuple(alarm_services)),
+            ("api_reachable", api_reachable),
+            ("token_endpoint_reachable", token_endpoint_reachable),
+            ("api_rtt_ms", api_rtt_ms),
+            ("attributes", attributes),
+        ):
+            object.__setattr__(self, name, value)
+
+    @property
+    def available(self):
+        """Return True if an alarm could be dispatched right now."""
+        return self.token_valid and self.api_reachable is not False
+
+    def __setattr__(self, name, value):
+        """Refuse changes, snapshots are immutable."""
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        """Compare snapshots by value."""
+        if not isinstance(other, NoonlightSnapshot):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __hash__(self):
+        """Hash snapshots by value."""
+        return hash(tuple(getattr(self, name) for name in self.__slots__[:-1]))
+
+    def __repr__(self):
+        """Return a readable representation."""
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in self.__slots__[:-1]
+        )
+        return f"{type(self).__name__}({fields})"
+
+    def replace(self, **changes):
+        """Return a copy of this snapshot with some fields changed."""
+        fields = {name: getattr(self, name) for name in self.__slots__[:-1]}
+        fields.update(changes)
+        return NoonlightSnapshot(**fields)
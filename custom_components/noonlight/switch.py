@@ -4,14 +4,12 @@ import logging
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
 from .const import (  # NOONLIGHT_SERVICES_FIRE, NOONLIGHT_SERVICES_MEDICAL,
     DOMAIN,
-    EVENT_NOONLIGHT_ALARM_CANCELED,
-    EVENT_NOONLIGHT_ALARM_CREATED,
-    EVENT_NOONLIGHT_TOKEN_REFRESHED,
+    EVENT_NOONLIGHT_STATE_CHANGED,
     NOONLIGHT_SERVICES_POLICE,
 )
 
@@ -33,29 +31,6 @@ async def async_setup_entry(
     noonlight_switch = NoonlightSwitch(noonlight_integration)
     async_add_entities([noonlight_switch])
 
-    def noonlight_token_refreshed():
-        noonlight_switch.schedule_update_ha_state()
-
-    def noonlight_alarm_canceled():
-        noonlight_switch._state = False
-        noonlight_switch.schedule_update_ha_state()
-
-    def noonlight_alarm_created():
-        noonlight_switch._state = True
-        noonlight_switch.schedule_update_ha_state()
-
-    async_dispatcher_connect(
-        hass, EVENT_NOONLIGHT_TOKEN_REFRESHED, noonlight_token_refreshed
-    )
-
-    async_dispatcher_connect(
-        hass, EVENT_NOONLIGHT_ALARM_CANCELED, noonlight_alarm_canceled
-    )
-
-    async_dispatcher_connect(
-        hass, EVENT_NOONLIGHT_ALARM_CREATED, noonlight_alarm_created
-    )
-
 
 class NoonlightSwitch(SwitchEntity):
     """Noonlight Alarm Switch."""
@@ -68,37 +43,41 @@ class NoonlightSwitch(SwitchEntity):
             self.noonlight.config.get('id', '')}"
         self._attr_name = DEFAULT_NAME
         self._attr_icon = "mdi:police-badge"
-        self._state = False
+
+    async def async_added_to_hass(self):
+        """Write state whenever the integration publishes a new snapshot."""
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self.noonlight.signal(EVENT_NOONLIGHT_STATE_CHANGED),
+                self._snapshot_changed,
+            )
+        )
+
+    @callback
+    def _snapshot_changed(self, snapshot):
+        self.async_write_ha_state()
 
     @property
     def available(self):
-        """Ensure that the Noonlight access token is valid."""
-        return self.noonlight.access_token_expires_in.total_seconds() > 0
+        """Ensure the token is valid and the Noonlight API is reachable."""
+        return self.noonlight.snapshot.available
 
     @property
     def extra_state_attributes(self):
-        """Return the current alarm attributes, when active."""
-        attr = {}
-        if self.noonlight._alarm is not None:
-            alarm = self.noonlight._alarm
-            attr["alarm_status"] = alarm.status
-            attr["alarm_id"] = alarm.id
-            attr["alarm_services"] = alarm.services
-        return attr
+        """Return the current alarm and reachability attributes."""
+        return self.noonlight.snapshot.attributes
 
     @property
     def is_on(self):
         """Return the status of the switch."""
-        return self._state
+        return self.noonlight.snapshot.alarm_active
 
     async def async_turn_on(self, **kwargs):
         """Activate an alarm. Defaults to `police` services."""
         if self.noonlight._alarm is None:
-            await self.noonlight.create_alarm()
-            if self.noonlight._alarm is not None:
-                self._state = True
+            await self.noonlight.create_alarm(source="switch")
 
     async def async_turn_off(self, **kwargs):
-        """Turn off the switch if the active alarm is canceled."""
-        if self.noonlight._alarm is None:
-            self._state = False
+        """Cancel the active alarm, the switch shows off right away."""
+        await self.noonlight.cancel_alarm()
@@ -0,0 +1,128 @@
+"""WebSocket API streaming Noonlight alarm lifecycle updates."""
+
+import voluptuous as vol
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from .const import (
+    ATTR_CONFIG_ENTRY_ID,
+    DOMAIN,
+    EVENT_NOONLIGHT_ENTRY_LOADED,
+    EVENT_NOONLIGHT_LIFECYCLE,
+)
+
+
+@callback
+def async_register_websocket_commands(hass: HomeAssistant):
+    """Register the Noonlight websocket commands."""
+    websocket_api.async_register_command(hass, websocket_subscribe)
+
+
+def _alarm_fields(snapshot):
+    return {
+        "alarm_id": snapshot.alarm_id,
+        "status": snapshot.alarm_status,
+        "active": snapshot.alarm_active,
+        "services": list(snapshot.alarm_services),
+    }
+
+
+def _entry_snapshot(integration):
+    return {
+        "seq": integration.lifecycle_seq,
+        "available": integration.snapshot.available,
+        **_alarm_fields(integration.snapshot),
+    }
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): "noonlight/subscribe",
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): str,
+    }
+)
+@websocket_api.require_admin
+@callback
+def websocket_subscribe(hass: HomeAssistant, connection, msg):
+    """Send a snapshot of every site, then a delta per alarm lifecycle change.
+
+    Deltas carry the per-site sequence number of the change, so a client can
+    tell it missed one and resubscribe for a fresh snapshot. Sites set up or
+    reloaded later are followed too, starting with a snapshot of that site,
+    whose sequence number starts over.
+    """
+    integrations = hass.data.get(DOMAIN, {})
+    entry_filter = msg.get(ATTR_CONFIG_ENTRY_ID)
+    if entry_filter is not None:
+        if entry_filter not in integrations:
+            connection.send_error(
+                msg["id"],
+                websocket_api.ERR_NOT_FOUND,
+                f"Noonlight entry {entry_filter} is not loaded",
+            )
+            return
+        integrations = {entry_filter: integrations[entry_filter]}
+
+    def send_snapshot(integrations):
+        connection.send_message(
+            websocket_api.event_message(
+                msg["id"],
+                {
+                    "type": "snapshot",
+                    "entries": {
+                        entry_id: _entry_snapshot(integration)
+                        for entry_id, integration in integrations.items()
+                    },
+                },
+            )
+        )
+
+    def forward(entry_id):
+        @callback
+        def lifecycle_changed(seq, event, snapshot):
+            connection.send_message(
+                websocket_api.event_message(
+                    msg["id"],
+                    {
+                        "type": event,
+                        "entry_id": entry_id,
+                        "seq": seq,
+                        **_alarm_fields(snapshot),
+                    },
+                )
+            )
+
+        return lifecycle_changed
+
+    unsubs = {}
+
+    def follow(entry_id, integration):
+        if entry_id not in unsubs:
+            unsubs[entry_id] = async_dispatcher_connect(
+                hass, integration.signal(EVENT_NOONLIGHT_LIFECYCLE), forward(entry_id)
+            )
+
+    @callback
+    def entry_loaded(entry_id):
+        integration = hass.data.get(DOMAIN, {}).get(entry_id)
+        if integration is None or entry_filter not in (None, entry_id):
+            return
+        follow(entry_id, integration)
+        send_snapshot({entry_id: integration})
+
+    for entry_id, integration in integrations.items():
+        follow(entry_id, integration)
+    unsub_loaded = async_dispatcher_connect(
+        hass, EVENT_NOONLIGHT_ENTRY_LOADED, entry_loaded
+    )
+
+    @callback
+    def unsubscribe():
+        unsub_loaded()
+        for unsub in unsubs.values():
+            unsub()
+
+    connection.subscriptions[msg["id"]] = unsubscribe
+    connection.send_result(msg["id"])
+    send_snapshot(integrations)
@@ -0,0 +1,329 @@
+"""Simulate many Noonlight sites on one event loop against a fake API.
+
+Each site is a real NoonlightEngine with its token check chain, reachability
+probe and, once an alarm is created, its status polling. As in Home
+Assistant, every engine sends through one shared NoonlightRequestScheduler,
+so its rate limits and per-origin probes apply across sites. No Home Assistant
+instance is started. Time is virtual: the loop jumps straight to the next
+scheduled timer and the engines read a clock that follows it, so hours of
+steady state run in seconds. Outbound requests are answered in-process by
+FakeNoonlightAPI.
+
+Home Assistant is not needed, only aiohttp and noonlight:
+
+    python tools/simulate_scale.py --sites 100 1000 10000
+"""
+
+import argparse
+import asyncio
+import gc
+import heapq
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from custom_components.noonlight.const import (  # noqa: E402
+    CONF_API_ENDPOINT,
+    CONF_SECRET,
+    CONF_TOKEN_ENDPOINT,
+    CONST_ALARM_STATUS_ACTIVE,
+    CONST_ALARM_STATUS_CANCELED,
+)
+from custom_components.noonlight.engine import NoonlightEngine  # noqa: E402
+from custom_components.noonlight.scheduler import (  # noqa: E402
+    DEFAULT_RATE,
+    NoonlightRequestScheduler,
+)
+
+API_ENDPOINT = "https://api.noonlight.invalid/platform/v1"
+TOKEN_ENDPOINT = "https://token.noonlight.invalid/ha/token"
+START_TIME = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Event loop whose clock jumps to the next timer when there is no work.
+
+    Loop time starts at zero, as an epoch-sized clock would lose the
+    resolution asyncio relies on; wall clocks are START_TIME + loop time.
+    Also counts scheduled timers and the wall-clock time spent handling each
+    virtual instant, which is the lag a real loop would see at that moment.
+    """
+
+    def __init__(self):
+        """Initialize the loop."""
+        super().__init__()
+        self._virtual_time = 0.0
+        self.timers_scheduled = 0
+        self.instant_costs = {}
+
+    def time(self):
+        """Return the virtual time."""
+        return self._virtual_time
+
+    def call_at(self, when, callback, *args, context=None):
+        """Schedule a timer, counting it."""
+        self.timers_scheduled += 1
+        return super().call_at(when, callback, *args, context=context)
+
+    def _run_once(self):
+        if not self._ready:
+            while self._scheduled and self._scheduled[0]._cancelled:
+                heapq.heappop(self._scheduled)
+            if self._scheduled and self._scheduled[0]._when > self._virtual_time:
+                self._virtual_time = self._scheduled[0]._when
+        instant = self._virtual_time
+        started = time.perf_counter()
+        super()._run_once()
+        self.instant_costs[instant] = self.instant_costs.get(instant, 0.0) + (
+            time.perf_counter() - started
+        )
+
+
+class FakeResponse:
+    """Minimal aiohttp response answered by FakeNoonlightAPI."""
+
+    def __init__(self, status, data):
+        """Initialize the response."""
+        self.status = status
+        self.headers = {}
+        self._data = data
+
+    async def json(self, content_type="application/json"):
+        """Return the response body."""
+        return self._data
+
+    def release(self):
+        """Release the response."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class FakeNoonlightAPI:
+    """In-process stand-in for the Noonlight and token endpoints.
+
+    Implements the request() method of aiohttp.ClientSession used by the
+    integration's request scheduler. Alarms cancel themselves after
+    `alarm_duration` seconds, as if the owner had given the operator a PIN.
+    """
+
+    def __init__(self, latency, alarm_duration):
+        """Initialize the fake API."""
+        self.latency = latency
+        self.alarm_duration = alarm_duration
+        self.requests = 0
+        self.requests_by_kind = {}
+        self._alarms = {}
+
+    def _count(self, kind):
+        self.requests += 1
+        self.requests_by_kind[kind] = self.requests_by_kind.get(kind, 0) + 1
+
+    async def request(self, method, url, json=None, headers=None, **kwargs):
+        """Answer a request after the configured latency."""
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(self.latency)
+        if method == "HEAD":
+            self._count("probe")
+            return FakeResponse(200, None)
+        if url == TOKEN_ENDPOINT:
+            self._count("token")
+            expires = datetime.fromtimestamp(
+                START_TIME + loop.time() + 12 * 3600, timezone.utc
+            )
+            return FakeResponse(
+                200, {"token": uuid.uuid4().hex, "expires": expires.isoformat()}
+            )
+        if method == "POST" and url == f"{API_ENDPOINT}/alarms":
+            self._count("create")
+            alarm_id = uuid.uuid4().hex
+            self._alarms[alarm_id] = loop.time() + self.alarm_duration
+            return FakeResponse(
+                201,
+                {
+                    "id": alarm_id,
+                    "status": CONST_ALARM_STATUS_ACTIVE,
+                    "services": (json or {}).get("services", {}),
+                },
+            )
+        if url.endswith("/status"):
+            alarm_id = url.rsplit("/", 2)[-2]
+            if method == "PUT":
+                self._count("cancel")
+                self._alarms[alarm_id] = loop.time()
+                return FakeResponse(200, {"status": 200})
+            self._count("status")
+            canceled = loop.time() >= self._alarms.get(alarm_id, 0)
+            return FakeResponse(
+                200,
+                {
+                    "status": (
+                        CONST_ALARM_STATUS_CANCELED
+                        if canceled
+                        else CONST_ALARM_STATUS_ACTIVE
+                    )
+                },
+            )
+        self._count("other")
+        return FakeResponse(404, {"message": "not found"})
+
+
+class VirtualClock:
+    """Engine clock following the virtual time of the loop."""
+
+    def __init__(self, loop):
+        """Initialize the clock."""
+        self._loop = loop
+
+    def now(self):
+        """Return the virtual UTC time."""
+        return datetime.fromtimestamp(self.time(), timezone.utc)
+
+    def time(self):
+        """Return the virtual UNIX timestamp."""
+        return START_TIME + self._loop.time()
+
+    def monotonic(self):
+        """Return the virtual monotonic time."""
+        return self._loop.time()
+
+    def call_later(self, delay, callback, *args):
+        """Call `callback(*args)` after `delay` virtual seconds."""
+        return self._loop.call_later(delay, callback, *args)
+
+
+def _lag_stats(loop, since, until):
+    costs = [
+        cost * 1000.0
+        for instant, cost in loop.instant_costs.items()
+        if since <= instant < until
+    ]
+    if not costs:
+        return {"p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    costs.sort()
+    return {
+        "p50_ms": round(statistics.median(costs), 3),
+        "p99_ms": round(costs[min(len(costs) - 1, int(len(costs) * 0.99))], 3),
+        "max_ms": round(costs[-1], 3),
+    }
+
+
+async def _run_phase(loop, api, duration):
+    """Advance virtual time and report what happened meanwhile."""
+    since = loop.time()
+    timers = loop.timers_scheduled
+    requests = api.requests
+    by_kind = dict(api.requests_by_kind)
+    await asyncio.sleep(duration)
+    return {
+        "virtual_seconds": duration,
+        "timers_scheduled": loop.timers_scheduled - timers,
+        "timers_pending": sum(1 for handle in loop._scheduled if not handle._cancelled),
+        "requests": api.requests - requests,
+        "requests_per_second": round((api.requests - requests) / duration, 3),
+        "requests_by_kind": {
+            kind: count - by_kind.get(kind, 0)
+            for kind, count in api.requests_by_kind.items()
+            if count - by_kind.get(kind, 0)
+        },
+        "loop_lag": _lag_stats(loop, since, loop.time()),
+    }
+
+
+async def simulate(sites, args):
+    """Set up the sites, then run a steady state and an alarm burst phase."""
+    loop = asyncio.get_running_loop()
+    clock = VirtualClock(loop)
+    api = FakeNoonlightAPI(args.api_latency_ms / 1000.0, args.alarm_duration)
+    scheduler = NoonlightRequestScheduler(api)
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    engines = []
+    for index in range(sites):
+        engine = NoonlightEngine(
+            {
+                "id": f"site-{index}",
+                CONF_SECRET: "secret",
+                CONF_API_ENDPOINT: API_ENDPOINT,
+                CONF_TOKEN_ENDPOINT: TOKEN_ENDPOINT,
+                "latitude": 40.0,
+                "longitude": -90.0,
+            },
+            api,
+            clock=clock,
+            scheduler=scheduler,
+        )
+        await engine.async_start()
+        engines.append(engine)
+    # The first token of every site goes through the shared rate limit
+    setup = await _run_phase(loop, api, 60 + sites / DEFAULT_RATE)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    steady = await _run_phase(loop, api, args.steady_hours * 3600)
+
+    rng = random.Random(args.seed)
+    burst_sites = rng.sample(engines, int(sites * args.burst_fraction))
+    for engine in burst_sites:
+        loop.call_later(
+            rng.uniform(0, args.burst_window),
+            lambda engine=engine: loop.create_task(engine.create_alarm()),
+        )
+    burst = await _run_phase(loop, api, args.burst_window + args.alarm_duration)
+    burst["alarms"] = len(burst_sites)
+
+    for engine in engines:
+        await engine.async_stop()
+
+    return {
+        "sites": sites,
+        "memory_per_site_bytes": round((after - before) / sites),
+        "setup": setup,
+        "steady_state": steady,
+        "alarm_burst": burst,
+    }
+
+
+def main():
+    """Run the simulation for each requested site count."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--steady-hours", type=float, default=6.0)
+    parser.add_argument("--burst-fraction", type=float, default=0.05)
+    parser.add_argument("--burst-window", type=float, default=10.0)
+    parser.add_argument("--alarm-duration", type=float, default=300.0)
+    parser.add_argument("--api-latency-ms", type=float, default=150.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = []
+    for sites in args.sites:
+        loop = VirtualTimeLoop()
+        asyncio.set_event_loop(loop)
+        started = time.perf_counter()
+        try:
+            result = loop.run_until_complete(simulate(sites, args))
+        finally:
+            loop.close()
+        result["wall_seconds"] = round(time.perf_counter() - started, 2)
+        results.append(result)
+        print(json.dumps(result, indent=2), flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    main()